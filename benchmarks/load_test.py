@@ -0,0 +1,355 @@
+"""
+End-to-end load test of the app against the local OpenAI simulator.
+
+The app runs in-process behind an ASGI transport and calls the simulator
+over real HTTP, so the upstream client, router and admission control are
+exercised. A weighted mix of register, login, ask, essay and /me/*
+requests is sent at fixed concurrency levels, throughput and latency
+percentiles are reported per route.
+
+POSTGRES_* must point to a scratch database: tables are created, test
+users are added and their balances topped up. Run from the project root:
+    python -m benchmarks.load_test --concurrency 10 50 --duration 30
+"""
+import os
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from benchmarks.openai_simulator import SimulatorConfig, create_server
+
+
+MIX = {
+    'register': 2,
+    'login': 5,
+    'ask': 30,
+    'ask_stream': 10,
+    'essay': 8,
+    'me_tokens': 25,
+    'me_can_compose_essay': 10,
+    'me_can_request_chatgpt': 10
+}
+
+THEMES = ('Трагизм Мцыри', 'Образ Онегина', 'Война и мир', 'Гроза')
+
+
+@dataclass
+class RouteStats:
+    latencies: list[float] = field(default_factory=list)
+    errors: defaultdict[int, int] = field(
+        default_factory=lambda: defaultdict(int)
+    )
+
+    def get_percentile(self, percentile: float) -> float:
+        latencies = sorted(self.latencies)
+        index = min(
+            int(len(latencies) * percentile / 100),
+            len(latencies) - 1
+        )
+        return latencies[index] * 1000
+
+
+@dataclass
+class LoadTestUser:
+    username: str
+    email: str
+    password: str = 'load-test-password'
+    access_token: str | None = None
+
+    @classmethod
+    def create(cls) -> 'LoadTestUser':
+        name = f'load{uuid.uuid4().hex[:8]}'
+        return cls(username=name, email=f'{name}@example.com')
+
+    def get_credentials(self) -> dict:
+        return {
+            'username': self.username,
+            'email': self.email,
+            'password': self.password
+        }
+
+    def get_headers(self) -> dict:
+        return {'Authorization': f'Bearer {self.access_token}'}
+
+
+class LoadTest:
+    def __init__(self, client, mix: dict[str, int], seed: int | None):
+        self.client = client
+        self.mix = mix
+        self.random = random.Random(seed)
+        self.users: list[LoadTestUser] = []
+        self.stats: defaultdict[str, RouteStats] = defaultdict(RouteStats)
+
+    async def add_user(self) -> None:
+        """Users added before the run have their balances topped up"""
+        user = LoadTestUser.create()
+
+        response = await self.register(user)
+        response.raise_for_status()
+        response = await self.login(user)
+        response.raise_for_status()
+
+        self.users.append(user)
+
+    async def register(self, user: LoadTestUser | None = None):
+        return await self.client.post(
+            '/users/register/',
+            json=(user or LoadTestUser.create()).get_credentials()
+        )
+
+    async def login(self, user: LoadTestUser | None = None):
+        user = user or self.random.choice(self.users)
+        response = await self.client.post(
+            '/users/login/',
+            json=user.get_credentials()
+        )
+        if response.status_code == 200:
+            user.access_token = response.json()['access_token']
+        return response
+
+    async def ask(self):
+        return await self.client.post(
+            '/ai/ask/',
+            json={'text': f'Вопрос {self.random.randint(0, 10 ** 6)}'},
+            headers=self.random.choice(self.users).get_headers()
+        )
+
+    async def ask_stream(self):
+        async with self.client.stream(
+            'POST',
+            '/ai/ask/stream/',
+            json={'text': f'Вопрос {self.random.randint(0, 10 ** 6)}'},
+            headers=self.random.choice(self.users).get_headers()
+        ) as response:
+            async for _ in response.aiter_bytes():
+                pass
+        return response
+
+    async def essay(self):
+        return await self.client.post(
+            '/ai/compose/essay/',
+            json={
+                'theme': self.random.choice(THEMES),
+                'author': 'Автор',
+                'word_count': self.random.choice((150, 250, 350)),
+                # Unique requests miss the essay cache
+                'additional_info': uuid.uuid4().hex
+            },
+            headers=self.random.choice(self.users).get_headers()
+        )
+
+    async def me_tokens(self):
+        return await self.client.get(
+            '/users/me/tokens/',
+            headers=self.random.choice(self.users).get_headers()
+        )
+
+    async def me_can_compose_essay(self):
+        return await self.client.get(
+            '/users/me/can_compose_essay/',
+            headers=self.random.choice(self.users).get_headers()
+        )
+
+    async def me_can_request_chatgpt(self):
+        return await self.client.get(
+            '/users/me/can_request_chatgpt/',
+            headers=self.random.choice(self.users).get_headers()
+        )
+
+    async def run_request(self, route: str) -> None:
+        start_time = time.perf_counter()
+        response = await getattr(self, route)()
+        latency = time.perf_counter() - start_time
+
+        stats = self.stats[route]
+        if response.status_code < 400:
+            stats.latencies.append(latency)
+        else:
+            stats.errors[response.status_code] += 1
+
+    async def run_worker(self, deadline: float) -> None:
+        routes = list(self.mix)
+        weights = list(self.mix.values())
+
+        while time.perf_counter() < deadline:
+            route = self.random.choices(routes, weights)[0]
+            await self.run_request(route)
+
+    async def run(self, concurrency: int, duration: float) -> float:
+        self.stats.clear()
+        start_time = time.perf_counter()
+
+        await asyncio.gather(*[
+            self.run_worker(start_time + duration)
+            for _ in range(concurrency)
+        ])
+        return time.perf_counter() - start_time
+
+
+async def top_up_balances() -> None:
+    from sqlalchemy import update
+
+    from src.database.database import async_session
+    from src.database.models import User
+
+    async with async_session() as session:
+        await session.execute(update(User).values(tokens_count=2 ** 31 - 1))
+        await session.commit()
+
+
+def print_report(concurrency: int, elapsed: float, load_test: LoadTest):
+    total = sum(
+        len(stats.latencies) for stats in load_test.stats.values()
+    )
+    print(
+        f'\nconcurrency {concurrency}: {total} ok requests in '
+        f'{elapsed:.1f} s, {total / elapsed:.1f} rps'
+    )
+    print(
+        f'  {"route":<24}{"ok":>7}{"rps":>8}'
+        f'{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}  errors'
+    )
+
+    for route in load_test.mix:
+        stats = load_test.stats.get(route)
+        if stats is None:
+            continue
+
+        errors = ', '.join(
+            f'{status}: {count}' for status, count in stats.errors.items()
+        )
+        if not stats.latencies:
+            print(f'  {route:<24}{0:>7}{"":>35}  {errors}')
+            continue
+
+        print(
+            f'  {route:<24}{len(stats.latencies):>7}'
+            f'{len(stats.latencies) / elapsed:>8.1f}'
+            f'{stats.get_percentile(50):>9.1f}'
+            f'{stats.get_percentile(95):>9.1f}'
+            f'{stats.get_percentile(99):>9.1f}  {errors}'
+        )
+
+
+def get_report(concurrency: int, elapsed: float, load_test: LoadTest):
+    return {
+        'concurrency': concurrency,
+        'elapsed': elapsed,
+        'routes': {
+            route: {
+                'ok': len(stats.latencies),
+                'rps': len(stats.latencies) / elapsed,
+                'p50_ms': stats.get_percentile(50),
+                'p95_ms': stats.get_percentile(95),
+                'p99_ms': stats.get_percentile(99),
+                'errors': dict(stats.errors)
+            } if stats.latencies else {'ok': 0, 'errors': dict(stats.errors)}
+            for route, stats in load_test.stats.items()
+        }
+    }
+
+
+async def run(args: argparse.Namespace) -> None:
+    simulator = create_server(
+        SimulatorConfig(
+            latency_median=args.latency_median,
+            latency_sigma=args.latency_sigma,
+            token_interval=args.token_interval,
+            error_rate=args.error_rate,
+            seed=args.seed
+        ),
+        port=args.simulator_port
+    )
+    simulator_task = asyncio.create_task(simulator.serve())
+    while not simulator.started:
+        await asyncio.sleep(0.01)
+
+    # Settings are read on import, so the app is imported after the
+    # environment points it at the simulator
+    import httpx
+
+    from src.main import app
+
+    reports = []
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            base_url='http://load-test',
+            # Unhandled errors are counted as 500 like behind a server
+            transport=httpx.ASGITransport(
+                app=app,
+                raise_app_exceptions=False
+            ),
+            timeout=None
+        ) as client:
+            load_test = LoadTest(client, args.mix, args.seed)
+
+            for _ in range(args.users):
+                await load_test.add_user()
+            await top_up_balances()
+
+            for concurrency in args.concurrency:
+                elapsed = await load_test.run(concurrency, args.duration)
+                print_report(concurrency, elapsed, load_test)
+                reports.append(get_report(concurrency, elapsed, load_test))
+
+    simulator.should_exit = True
+    await simulator_task
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(reports, file, indent=2)
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    mix = {}
+
+    for item in value.split(','):
+        route, _, weight = item.partition('=')
+        if route not in MIX:
+            raise argparse.ArgumentTypeError(f'Unknown route: {route}')
+        mix[route] = int(weight)
+
+    return mix
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[10])
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument(
+        '--mix',
+        type=parse_mix,
+        default=MIX,
+        help='route=weight pairs, e.g. ask=10,me_tokens=5'
+    )
+    parser.add_argument('--latency-median', type=float, default=0.3)
+    parser.add_argument('--latency-sigma', type=float, default=0.5)
+    parser.add_argument('--token-interval', type=float, default=0.005)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--simulator-port', type=int, default=8100)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--output', help='Save the report as JSON')
+    args = parser.parse_args()
+
+    os.environ['AI_BACKENDS'] = json.dumps([{
+        'name': 'simulator',
+        'base_url': f'http://127.0.0.1:{args.simulator_port}/v1',
+        'api_key': 'simulator',
+        'proxy': ''
+    }])
+    # One client address would be rate limited as a single user
+    os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,265 @@
+"""
+Micro-benchmarks of per-request CPU costs: JWT, bcrypt, token counting
+and response serialization.
+
+Each benchmark reports the best per-call time of several repeats, which
+is the most stable statistic on a noisy machine. Run from the project
+root (settings are read from `.env`):
+    python -m benchmarks.micro_benchmark            # compare to baseline
+    python -m benchmarks.micro_benchmark --save     # record a new baseline
+    python -m benchmarks.micro_benchmark -k jwt --threshold 0.1
+
+Comparison exits with status 1 if any benchmark is slower than its
+baseline by more than the threshold or has no baseline. A baseline is
+saved only if no group was skipped (tiktoken needs network access to
+download its encodings once). Baselines are only comparable on the
+machine and settings (e.g. bcrypt rounds) they were recorded with, so
+they aren't committed.
+"""
+import sys
+import json
+import asyncio
+import argparse
+import platform
+import tempfile
+
+from pathlib import Path
+from typing import Callable
+
+from benchmarks.tokenization_benchmark import (
+    LONG_TEXT,
+    SHORT_TEXT,
+    measure,
+    measure_async
+)
+from src.enums.ai_models import Model
+from src.schemas import ai_schema
+from src.core.config import settings
+from src.utils import auth_utils, jwt_key_utils
+from src.utils.ai import ai_utils, tokenizer_utils
+
+
+BASELINE_PATH = Path(__file__).parent / 'baselines' / 'micro_benchmark.json'
+
+loop = asyncio.new_event_loop()
+
+
+def use_throwaway_jwt_key() -> None:
+    """
+    Signs with a fresh RSA key, so the results don't depend on
+    the keys of the deployment and no keys are needed to run
+    """
+    with tempfile.TemporaryDirectory() as keys_dir:
+        keys_dir = Path(keys_dir)
+        settings.auth_jwt.keys_dir = keys_dir
+        settings.auth_jwt.private_key_path = keys_dir / 'private.pem'
+        settings.auth_jwt.public_key_path = keys_dir / 'public.pem'
+        settings.auth_jwt.signing_kid = jwt_key_utils.DEFAULT_KID
+
+        jwt_key_utils.write_key_pair(
+            settings.auth_jwt.private_key_path,
+            settings.auth_jwt.public_key_path
+        )
+        # Loaded while the files exist, cached afterwards
+        jwt_key_utils.get_keys.cache_clear()
+        jwt_key_utils.get_keys()
+
+
+def get_jwt_benchmarks() -> dict[str, Callable[[], float]]:
+    use_throwaway_jwt_key()
+    key = jwt_key_utils.get_signing_key()
+    payload = {'sub': '1', 'type': settings.auth_jwt.access_token_name}
+    token = auth_utils.encode_jwt(
+        payload,
+        expire_minutes=settings.auth_jwt.access_token_expire_minutes
+    )
+
+    return {
+        f'encode_jwt[{key.algorithm}]': lambda: measure(
+            lambda: auth_utils.encode_jwt(
+                payload,
+                expire_minutes=settings.auth_jwt.access_token_expire_minutes
+            )
+        ),
+        f'decode_jwt[{key.algorithm}]': lambda: measure(
+            lambda: auth_utils.decode_jwt(token)
+        )
+    }
+
+
+def get_password_benchmarks() -> dict[str, Callable[[], float]]:
+    password = 'load-test-password'
+    hashed_password = auth_utils.hash_password_sync(password)
+    rounds = settings.password_hashing.bcrypt_rounds
+
+    return {
+        f'hash_password[{rounds}]': lambda: measure_async(
+            loop,
+            lambda: auth_utils.hash_password(password)
+        ),
+        f'validate_password[{rounds}]': lambda: measure_async(
+            loop,
+            lambda: auth_utils.validate_password(password, hashed_password)
+        )
+    }
+
+
+def get_tokens_count_benchmarks() -> dict[str, Callable[[], float]]:
+    tokenizer_utils.init_tokenizers()
+    model = Model.GPT_4O_MINI
+
+    return {
+        f'get_tokens_count[{name}]': (
+            lambda text=text: measure_async(
+                loop,
+                lambda: ai_utils.get_tokens_count(text=text, model=model)
+            )
+        )
+        for name, text in (('short', SHORT_TEXT), ('long', LONG_TEXT))
+    }
+
+
+def get_schema_benchmarks() -> dict[str, Callable[[], float]]:
+    benchmarks = {}
+
+    for schema in (ai_schema.AIResponse, ai_schema.ComposeEssayResponse):
+        data = {'text': LONG_TEXT, 'tokens': 1000}
+        response = schema.model_validate(data)
+
+        benchmarks[f'{schema.__name__}.model_validate'] = (
+            lambda schema=schema, data=data: measure(
+                lambda: schema.model_validate(data)
+            )
+        )
+        benchmarks[f'{schema.__name__}.model_dump_json'] = (
+            lambda response=response: measure(response.model_dump_json)
+        )
+
+    return benchmarks
+
+
+BENCHMARK_GROUPS = (
+    get_jwt_benchmarks,
+    get_password_benchmarks,
+    get_tokens_count_benchmarks,
+    get_schema_benchmarks
+)
+
+
+def run_benchmarks(
+    name_filter: str | None
+) -> tuple[dict[str, float], list[str]]:
+    """
+    Returns the results and the names of the groups that couldn't run
+    """
+    results = {}
+    skipped = []
+
+    for get_benchmarks in BENCHMARK_GROUPS:
+        try:
+            benchmarks = get_benchmarks()
+        except Exception as error:
+            # E.g. tiktoken can't download encodings offline
+            print(
+                f'{get_benchmarks.__name__} skipped: '
+                f'{type(error).__name__}'
+            )
+            skipped.append(get_benchmarks.__name__)
+            continue
+
+        for name, benchmark in benchmarks.items():
+            if name_filter and name_filter not in name:
+                continue
+
+            results[name] = benchmark()
+            print(f'  {name:<40}{results[name]:>14.2f} us')
+
+    return results, skipped
+
+
+def compare(
+    results: dict[str, float],
+    baseline: dict[str, float],
+    threshold: float
+) -> list[str]:
+    """
+    Returns the benchmarks slower than the baseline by more than
+    `threshold`, and those the baseline doesn't cover
+    """
+    regressions = []
+
+    print(
+        f'\n  {"benchmark":<40}{"baseline us":>14}'
+        f'{"now us":>12}{"change":>9}'
+    )
+    for name, result in results.items():
+        if name not in baseline:
+            print(f'  {name:<40}{"-":>14}{result:>12.2f}  NO BASELINE')
+            regressions.append(name)
+            continue
+
+        change = result / baseline[name] - 1
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+
+        print(
+            f'  {name:<40}{baseline[name]:>14.2f}{result:>12.2f}'
+            f'{change:>+9.1%}{flag}'
+        )
+
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument(
+        '--save',
+        action='store_true',
+        help='Record the results as the new baseline'
+    )
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=0.25,
+        help='Slowdown share flagged as a regression'
+    )
+    parser.add_argument('-k', dest='name_filter', help='Run matching only')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH)
+    args = parser.parse_args()
+
+    results, skipped = run_benchmarks(args.name_filter)
+
+    if args.save:
+        if skipped:
+            # The comparison would silently never cover these
+            print(f'\nNot saved, a baseline must cover {", ".join(skipped)}')
+            sys.exit(1)
+
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps({
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': results
+        }, indent=2) + '\n')
+        print(f'\nBaseline saved to {args.baseline}')
+        return
+
+    if not args.baseline.exists():
+        print('\nNo baseline, record one with --save')
+        return
+
+    baseline = json.loads(args.baseline.read_text())
+    regressions = compare(results, baseline['results'], args.threshold)
+
+    if regressions:
+        print(
+            f'\n{len(regressions)} regressions past {args.threshold:.0%} '
+            'or without a baseline'
+        )
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
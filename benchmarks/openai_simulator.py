@@ -0,0 +1,203 @@
+"""
+Local OpenAI-compatible chat completions server for load tests.
+
+Latency, answer length and errors are drawn from configurable
+distributions, streaming answers are sent token by token.
+
+Run standalone:
+    python -m benchmarks.openai_simulator --port 8100 --error-rate 0.01
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+import uvicorn
+
+from dataclasses import dataclass
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+WORDS = (
+    'сочинение герой свобода природа жизнь автор роман поэт мысль '
+    'the a model answer question text of and to in is that it'
+).split()
+
+
+@dataclass
+class SimulatorConfig:
+    # Time to the first token, lognormal around the median
+    latency_median: float = 0.3
+    latency_sigma: float = 0.5
+    # Delay between streamed tokens
+    token_interval: float = 0.005
+    completion_tokens_min: int = 50
+    completion_tokens_max: int = 400
+    # Share of requests answered with an error status
+    error_rate: float = 0.0
+    error_statuses: tuple = (429, 500, 503)
+    seed: int | None = None
+
+
+class Simulator:
+    def __init__(self, config: SimulatorConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.requests = 0
+        self.errors = 0
+
+    def get_latency(self) -> float:
+        return self.config.latency_median * self.random.lognormvariate(
+            0,
+            self.config.latency_sigma
+        )
+
+    def get_completion_tokens(self, max_tokens: int | None) -> int:
+        tokens = self.random.randint(
+            self.config.completion_tokens_min,
+            self.config.completion_tokens_max
+        )
+        return min(tokens, max_tokens) if max_tokens else tokens
+
+    def get_error(self) -> JSONResponse | None:
+        if self.random.random() >= self.config.error_rate:
+            return None
+
+        self.errors += 1
+        return JSONResponse(
+            {'error': {'message': 'Injected error', 'type': 'simulated'}},
+            status_code=self.random.choice(self.config.error_statuses)
+        )
+
+    def get_completion(self, body: dict, tokens: int) -> dict:
+        return {
+            'id': f'chatcmpl-{self.requests}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'simulated'),
+            'choices': [{
+                'index': 0,
+                'message': {
+                    'role': 'assistant',
+                    'content': ' '.join(
+                        self.random.choice(WORDS) for _ in range(tokens)
+                    )
+                },
+                'finish_reason': 'stop'
+            }],
+            'usage': get_usage(body, tokens)
+        }
+
+    async def stream_completion(self, body: dict, tokens: int):
+        chunk = {
+            'id': f'chatcmpl-{self.requests}',
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': body.get('model', 'simulated')
+        }
+
+        for _ in range(tokens):
+            content = self.random.choice(WORDS) + ' '
+            yield get_sse({
+                **chunk,
+                'choices': [{
+                    'index': 0,
+                    'delta': {'content': content},
+                    'finish_reason': None
+                }]
+            })
+            await asyncio.sleep(self.config.token_interval)
+
+        yield get_sse({
+            **chunk,
+            'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]
+        })
+        if body.get('stream_options', {}).get('include_usage'):
+            yield get_sse({
+                **chunk,
+                'choices': [],
+                'usage': get_usage(body, tokens)
+            })
+        yield 'data: [DONE]\n\n'
+
+
+def get_usage(body: dict, completion_tokens: int) -> dict:
+    prompt_tokens = sum(
+        len(message.get('content', '').split())
+        for message in body.get('messages', [])
+    )
+    return {
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'total_tokens': prompt_tokens + completion_tokens
+    }
+
+
+def get_sse(data: dict) -> str:
+    return f'data: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+def create_app(config: SimulatorConfig) -> FastAPI:
+    app = FastAPI()
+    simulator = Simulator(config)
+    app.state.simulator = simulator
+
+    @app.post('/v1/chat/completions')
+    async def create_chat_completion(request: Request):
+        body = await request.json()
+        simulator.requests += 1
+
+        await asyncio.sleep(simulator.get_latency())
+
+        error = simulator.get_error()
+        if error is not None:
+            return error
+
+        tokens = simulator.get_completion_tokens(body.get('max_tokens'))
+
+        if body.get('stream'):
+            return StreamingResponse(
+                simulator.stream_completion(body, tokens),
+                media_type='text/event-stream'
+            )
+        return simulator.get_completion(body, tokens)
+
+    return app
+
+
+def create_server(
+    config: SimulatorConfig,
+    host: str = '127.0.0.1',
+    port: int = 8100
+) -> uvicorn.Server:
+    return uvicorn.Server(uvicorn.Config(
+        create_app(config),
+        host=host,
+        port=port,
+        log_level='warning',
+        access_log=False
+    ))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--latency-median', type=float, default=0.3)
+    parser.add_argument('--latency-sigma', type=float, default=0.5)
+    parser.add_argument('--token-interval', type=float, default=0.005)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = SimulatorConfig(
+        latency_median=args.latency_median,
+        latency_sigma=args.latency_sigma,
+        token_interval=args.token_interval,
+        error_rate=args.error_rate
+    )
+    create_server(config, args.host, args.port).run()
+
+
+if __name__ == '__main__':
+    main()
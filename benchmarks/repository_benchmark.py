@@ -0,0 +1,142 @@
+"""
+Benchmark of repository reads: full ORM loads against column projections.
+
+Needs the database from `.env`. A benchmark user and cached essay
+variants are created if missing. Run from the project root:
+    python -m benchmarks.repository_benchmark
+    python -m benchmarks.repository_benchmark -k tokens_count
+
+Each pair runs the ORM query (a fresh AsyncSession, an identity-mapped
+instance) and the projection used by the endpoints now. Times include
+the round trip to the database, so compare them only within one run.
+"""
+import argparse
+
+from datetime import timedelta
+from typing import Callable
+from sqlalchemy import select, func
+
+from benchmarks.micro_benchmark import loop
+from benchmarks.tokenization_benchmark import measure_async
+from src.database.database import async_session, engine, init_db
+from src.database.models import EssayCacheEntry, User
+from src.repositories import essay_cache_repository, user_repository
+from src.exceptions import user_exceptions
+from src.schemas import ai_schema, user_schema
+
+
+USERNAME = 'repo-benchmark'
+EMAIL = 'repository-benchmark@example.com'
+CACHE_KEY = 'repository-benchmark'
+CACHE_TTL = timedelta(days=365)
+
+
+async def get_tokens_count_orm(user_id: int) -> int:
+    user = await user_repository.get_user(user_id=user_id)
+    return user.tokens_count
+
+
+async def get_tokens_count_session(user_id: int) -> int:
+    """The column select through a session, as before the projections"""
+    async with async_session() as session:
+        return await session.scalar(
+            select(User.tokens_count).where(User.id == user_id)
+        )
+
+
+async def get_essay_variants_orm() -> list[ai_schema.CachedEssay]:
+    async with async_session() as session:
+        entries = await session.scalars(
+            select(EssayCacheEntry)
+            .where(
+                EssayCacheEntry.cache_key == CACHE_KEY,
+                EssayCacheEntry.created_at > func.now() - CACHE_TTL
+            )
+            .order_by(EssayCacheEntry.variant)
+        )
+
+        return [
+            ai_schema.CachedEssay.model_validate(entry)
+            for entry in entries
+        ]
+
+
+async def setup() -> int:
+    await init_db()
+
+    try:
+        await user_repository.create_user(user_schema.UserToAddInDB(
+            username=USERNAME,
+            email=EMAIL,
+            hashed_password=b'hash'
+        ))
+    except user_exceptions.UserAlreadyExistsError:
+        pass
+
+    for variant in range(3):
+        await essay_cache_repository.add_essay_variant(
+            CACHE_KEY,
+            variant,
+            text='Сочинение. ' * 300,
+            tokens=1000,
+            ttl=CACHE_TTL
+        )
+
+    credentials = await user_repository.get_user_credentials(email=EMAIL)
+    return credentials.id
+
+
+def get_benchmarks(user_id: int) -> dict[str, Callable[[], float]]:
+    return {
+        'get_user[email] (ORM)': lambda: measure_async(
+            loop,
+            lambda: user_repository.get_user(email=EMAIL)
+        ),
+        'get_user_credentials[email]': lambda: measure_async(
+            loop,
+            lambda: user_repository.get_user_credentials(email=EMAIL)
+        ),
+        'tokens_count (ORM)': lambda: measure_async(
+            loop,
+            lambda: get_tokens_count_orm(user_id)
+        ),
+        'tokens_count (session select)': lambda: measure_async(
+            loop,
+            lambda: get_tokens_count_session(user_id)
+        ),
+        'get_user_tokens_count': lambda: measure_async(
+            loop,
+            lambda: user_repository.get_user_tokens_count(user_id)
+        ),
+        'essay_variants (ORM)': lambda: measure_async(
+            loop,
+            get_essay_variants_orm
+        ),
+        'get_essay_variants': lambda: measure_async(
+            loop,
+            lambda: essay_cache_repository.get_essay_variants(
+                CACHE_KEY,
+                CACHE_TTL
+            )
+        )
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('-k', dest='name_filter', help='Run matching only')
+    args = parser.parse_args()
+
+    user_id = loop.run_until_complete(setup())
+
+    for name, benchmark in get_benchmarks(user_id).items():
+        if args.name_filter and args.name_filter not in name:
+            continue
+
+        print(f'  {name:<40}{benchmark():>14.2f} us')
+
+    loop.run_until_complete(engine.dispose())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Per-request tokenization cost before and after the tokenizer registry.
+
+Run from the project root (settings are read from `.env`):
+    python -m benchmarks.tokenization_benchmark
+"""
+import asyncio
+import timeit
+import tiktoken
+
+from typing import Awaitable, Callable
+from src.enums.ai_models import Model
+from src.utils.ai import ai_utils, tokenizer_utils
+
+
+SHORT_TEXT = 'Привет! Чем я могу помочь тебе сегодня?'
+LONG_TEXT = (
+    'Мцыри — романтический герой, который всю жизнь стремился к свободе. '
+    'Three days of freedom were worth more to him than the monastery. '
+) * 60
+
+REPEAT = 15
+
+
+def get_tokens_count_before(text: str, model: Model) -> int:
+    # Implementation before the registry: encoding resolved on every call
+    result = 0
+
+    if model == Model.GPT_4O_MINI:
+        encoding = tiktoken.encoding_for_model(model.value)
+        result = len(encoding.encode(text))
+
+    return result
+
+
+def measure(function: Callable[[], object]) -> float:
+    """
+    Returns the best per-call time in microseconds, the number of calls
+    per repeat is chosen to take at least 0.2 seconds
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    timings = timer.repeat(number=number, repeat=REPEAT)
+    return min(timings) / number * 1_000_000
+
+
+def measure_async(
+    loop: asyncio.AbstractEventLoop,
+    function: Callable[[], Awaitable[object]]
+) -> float:
+    """
+    Same as `measure`, a batch of calls is awaited in one loop run
+    so the event loop start-up is not counted
+    """
+    def run_batch(number: int) -> None:
+        async def batch() -> None:
+            for _ in range(number):
+                await function()
+
+        loop.run_until_complete(batch())
+
+    number = 1
+    while timeit.timeit(lambda: run_batch(number), number=1) < 0.2:
+        number *= 2
+
+    timings = [
+        timeit.timeit(lambda: run_batch(number), number=1)
+        for _ in range(REPEAT)
+    ]
+    return min(timings) / number * 1_000_000
+
+
+def main() -> None:
+    model = Model.GPT_4O_MINI
+    tokenizer_utils.init_tokenizers()
+
+    loop = asyncio.new_event_loop()
+
+    for name, text in (('short', SHORT_TEXT), ('long', LONG_TEXT)):
+        completion_tokens = get_tokens_count_before(text, model)
+
+        before = measure(lambda: get_tokens_count_before(text, model))
+        after_local = measure_async(
+            loop,
+            lambda: ai_utils.get_tokens_count(text=text, model=model)
+        )
+        after_usage = measure_async(
+            loop,
+            lambda: ai_utils.get_tokens_count(
+                text=text,
+                model=model,
+                completion_tokens=completion_tokens
+            )
+        )
+
+        print(f'{name} text ({len(text)} chars, {completion_tokens} tokens)')
+        print(f'  before:               {before:10.1f} us')
+        print(f'  after, local encode:  {after_local:10.1f} us')
+        print(f'  after, upstream usage: {after_usage:9.1f} us')
+
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,42 @@
+import anyio
+import asyncio
+import logging
+import openai
 import src.repositories.user_repository as user_repository
+import src.repositories.essay_job_repository as essay_job_repository
 
-from fastapi import APIRouter, status, Depends
+from typing import AsyncGenerator, AsyncIterator
+from dataclasses import dataclass
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    HTTPException,
+    status
+)
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.schemas import ai_schema
 from src.core.config import settings
-from src.utils import auth_utils, response_utils
-from src.exceptions import user_exceptions
-from src.utils.ai import ai_utils
+from src.database.database import get_session
 from src.enums.ai_models import Model
+from src.utils import (
+    auth_utils,
+    balance_cache_utils,
+    metrics_utils,
+    rate_limit_utils,
+    response_utils,
+    usage_utils
+)
+from src.exceptions import (
+    user_exceptions, ai_exceptions, service_exceptions
+)
+from src.utils.ai import ai_utils, essay_cache_utils
 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(
     prefix='/ai',
     tags=['ai']
@@ -26,40 +53,360 @@ router = APIRouter(
         ),
         status.HTTP_400_BAD_REQUEST: response_utils.get_error_response_schema(
             user_exceptions.UserTokensNotEnoughError.detail
+        ),
+        status.HTTP_503_SERVICE_UNAVAILABLE: (
+            response_utils.get_error_response_schema(
+                service_exceptions.ServiceBusyError.detail
+            )
         )
     }
 )
 async def request_ai(
     request: ai_schema.AIRequest,
-    user_payload: dict = Depends(auth_utils.get_token_payload)
+    user_payload: dict = Depends(auth_utils.get_token_payload),
+    session: AsyncSession = Depends(get_session)
 ):
     await auth_utils.validate_token_type(
         token_type=settings.auth_jwt.access_token_name,
         payload=user_payload
     )
-
     user_id = int(user_payload['sub'])
-    user = await user_repository.get_user(user_id=user_id)
 
-    if user.tokens_count < settings.ai.min_tokens_for_ai:
-        raise user_exceptions.UserTokensNotEnoughError()
+    reservation = await balance_cache_utils.reserve_tokens(
+        user_id=user_id,
+        amount=settings.ai.min_tokens_for_ai,
+        session=session
+    )
+    # Returns the connection to the pool for the upstream call
+    await session.commit()
+    tokens_count = 0
 
-    ai_response = await ai_utils.ai_request(
-        request=request.text,
-        model=request.model
+    try:
+        ai_response = await ai_utils.ai_request(
+            request=request.text,
+            model=request.model,
+            user_id=user_id
+        )
+
+        tokens_count = await ai_utils.get_tokens_count(
+            text=ai_response.text,
+            model=request.model,
+            completion_tokens=ai_response.completion_tokens,
+            backend=ai_response.backend
+        )
+    finally:
+        with anyio.CancelScope(shield=True):
+            await balance_cache_utils.settle_tokens(
+                reservation,
+                tokens_count,
+                session
+            )
+            await session.commit()
+        metrics_utils.tokens_debited.inc(
+            request.model.value,
+            amount=tokens_count
+        )
+
+    usage_utils.record_usage(
+        user_id=user_id,
+        model=request.model,
+        endpoint='ask',
+        completion_tokens=tokens_count,
+        prompt_tokens=ai_response.prompt_tokens,
+        upstream_latency=ai_response.latency
     )
 
+    return ai_schema.AIResponse(text=ai_response.text, tokens=tokens_count)
+
+
+def get_batch_item_result(
+    task: asyncio.Task[ai_schema.AIBatchItemResponse]
+) -> ai_schema.AIBatchItemResponse:
+    if task.cancelled():
+        return ai_schema.AIBatchItemResponse(error='AI request cancelled')
+
+    error = task.exception()
+    if error is None:
+        return task.result()
+
+    if isinstance(error, HTTPException):
+        return ai_schema.AIBatchItemResponse(error=error.detail)
+
+    logger.error('Batch item failed', exc_info=error)
+    return ai_schema.AIBatchItemResponse(
+        error=f'AI request failed: {type(error).__name__}'
+    )
+
+
+async def request_ai_batch_item(
+    request: ai_schema.AIRequest,
+    semaphore: asyncio.Semaphore,
+    user_id: int
+) -> ai_schema.AIBatchItemResponse:
+    async with semaphore:
+        try:
+            ai_response = await ai_utils.ai_request(
+                request=request.text,
+                model=request.model,
+                user_id=user_id
+            )
+        except openai.OpenAIError as error:
+            return ai_schema.AIBatchItemResponse(
+                error=f'AI request failed: {type(error).__name__}'
+            )
+        except service_exceptions.ServiceBusyError as error:
+            return ai_schema.AIBatchItemResponse(error=error.detail)
+
     tokens_count = await ai_utils.get_tokens_count(
-        text=ai_response,
-        model=request.model
+        text=ai_response.text,
+        model=request.model,
+        completion_tokens=ai_response.completion_tokens,
+        backend=ai_response.backend
+    )
+    usage_utils.record_usage(
+        user_id=user_id,
+        model=request.model,
+        endpoint='ask_batch',
+        completion_tokens=tokens_count,
+        prompt_tokens=ai_response.prompt_tokens,
+        upstream_latency=ai_response.latency
+    )
+
+    return ai_schema.AIBatchItemResponse(
+        text=ai_response.text,
+        tokens=tokens_count
+    )
+
+
+@router.post(
+    '/ask/batch/',
+    response_model=ai_schema.AIBatchResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        **response_utils.combine_error_responses(
+            auth_utils.get_auth_responses()
+        ),
+        status.HTTP_400_BAD_REQUEST: response_utils.get_error_response_schema(
+            user_exceptions.UserTokensNotEnoughError.detail
+        ),
+        status.HTTP_429_TOO_MANY_REQUESTS: (
+            response_utils.get_error_response_schema(
+                service_exceptions.TooManyRequestsError.detail
+            )
+        )
+    },
+    description=(
+        "Answer several requests at once. The balance is checked and "
+        "debited once for the whole batch, failed requests are not billed. "
+        "Each request counts against the AI rate limit."
+    )
+)
+async def request_ai_batch(
+    request: ai_schema.AIBatchRequest,
+    user_payload: dict = Depends(auth_utils.get_token_payload),
+    session: AsyncSession = Depends(get_session)
+):
+    await auth_utils.validate_token_type(
+        token_type=settings.auth_jwt.access_token_name,
+        payload=user_payload
     )
-    new_user_tokens_count = user.tokens_count - tokens_count
-    await user_repository.update_user_tokens_count(
+
+    user_id = int(user_payload['sub'])
+
+    # The rate limit middleware took one token for the whole batch
+    await rate_limit_utils.take_extra(
+        'ai',
         user_id,
-        new_user_tokens_count
+        cost=len(request.requests) - 1
     )
 
-    return ai_schema.AIResponse(text=ai_response, tokens=tokens_count)
+    reservation = await balance_cache_utils.reserve_tokens(
+        user_id=user_id,
+        amount=settings.ai.min_tokens_for_ai * len(request.requests),
+        session=session
+    )
+    await session.commit()
+    semaphore = asyncio.Semaphore(settings.ai.batch_concurrency)
+    tasks = [
+        asyncio.create_task(request_ai_batch_item(item, semaphore, user_id))
+        for item in request.requests
+    ]
+
+    try:
+        await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        with anyio.CancelScope(shield=True):
+            # On cancellation the unfinished items are stopped, the
+            # finished ones are still billed
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            results = [get_batch_item_result(task) for task in tasks]
+
+            await balance_cache_utils.settle_tokens(
+                reservation,
+                sum(result.tokens for result in results),
+                session
+            )
+            await session.commit()
+        for item, result in zip(request.requests, results):
+            metrics_utils.tokens_debited.inc(
+                item.model.value,
+                amount=result.tokens
+            )
+
+    return ai_schema.AIBatchResponse(
+        results=results,
+        tokens=sum(result.tokens for result in results)
+    )
+
+
+@dataclass(slots=True)
+class AIStream:
+    request: ai_schema.AIRequest
+    user_id: int
+    reservation: balance_cache_utils.TokenReservation
+    deltas: AsyncGenerator[ai_schema.AICompletion, None]
+    tokens_count: int = 0
+    usage: ai_schema.AICompletion | None = None
+    closed: bool = False
+
+    async def close(self) -> None:
+        """
+        Releases the upstream stream and its admission slot and debits
+        the delivered part. Called by the body and by the response,
+        the client may be gone before the body even starts.
+        """
+        if self.closed:
+            return
+        self.closed = True
+
+        with anyio.CancelScope(shield=True):
+            await self.deltas.aclose()
+            await balance_cache_utils.settle_tokens(
+                self.reservation,
+                self.tokens_count
+            )
+        metrics_utils.tokens_debited.inc(
+            self.request.model.value,
+            amount=self.tokens_count
+        )
+        usage_utils.record_usage(
+            user_id=self.user_id,
+            model=self.request.model,
+            endpoint='ask_stream',
+            completion_tokens=self.tokens_count,
+            prompt_tokens=self.usage.prompt_tokens if self.usage else None,
+            upstream_latency=self.usage.latency if self.usage else None
+        )
+
+
+async def stream_ai_response(
+    stream: AIStream,
+    first_delta: ai_schema.AICompletion | None
+) -> AsyncIterator[str]:
+    try:
+        delta = first_delta
+
+        while delta is not None:
+            if delta.completion_tokens is not None:
+                # Upstream usage replaces the local estimate
+                stream.tokens_count = delta.completion_tokens
+                stream.usage = delta
+            else:
+                stream.tokens_count += await ai_utils.get_tokens_count(
+                    text=delta.text,
+                    model=stream.request.model,
+                    backend=delta.backend
+                )
+                yield response_utils.get_sse_event(
+                    ai_schema.AIStreamChunk(text=delta.text)
+                )
+
+            delta = await anext(stream.deltas, None)
+    finally:
+        # The client may disconnect mid-stream: the upstream is released
+        # now, not when garbage collected
+        await stream.close()
+
+    yield response_utils.get_sse_event(
+        ai_schema.AIStreamEnd(tokens=stream.tokens_count),
+        event='done'
+    )
+
+
+@router.post(
+    '/ask/stream/',
+    response_class=StreamingResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        **response_utils.combine_error_responses(
+            auth_utils.get_auth_responses()
+        ),
+        status.HTTP_400_BAD_REQUEST: response_utils.get_error_response_schema(
+            user_exceptions.UserTokensNotEnoughError.detail
+        ),
+        status.HTTP_503_SERVICE_UNAVAILABLE: (
+            response_utils.get_error_response_schema(
+                service_exceptions.ServiceBusyError.detail
+            )
+        )
+    },
+    description=(
+        "Stream AI response as server-sent events. Each delta is sent as "
+        "soon as it arrives, the final `done` event contains spent tokens."
+    )
+)
+async def request_ai_stream(
+    request: ai_schema.AIRequest,
+    user_payload: dict = Depends(auth_utils.get_token_payload),
+    session: AsyncSession = Depends(get_session)
+):
+    await auth_utils.validate_token_type(
+        token_type=settings.auth_jwt.access_token_name,
+        payload=user_payload
+    )
+
+    user_id = int(user_payload['sub'])
+
+    reservation = await balance_cache_utils.reserve_tokens(
+        user_id=user_id,
+        amount=settings.ai.min_tokens_for_ai,
+        session=session
+    )
+    # The request's session is closed before the response is streamed,
+    # the reservation is settled in a session of its own
+    await session.commit()
+    deltas = ai_utils.ai_stream_request(
+        request=request.text,
+        model=request.model,
+        user_id=user_id
+    )
+
+    try:
+        # Admission and upstream errors still get a proper status code
+        first_delta = await anext(deltas, None)
+    except BaseException:
+        with anyio.CancelScope(shield=True):
+            await balance_cache_utils.settle_tokens(reservation, 0)
+        raise
+
+    stream = AIStream(
+        request=request,
+        user_id=user_id,
+        reservation=reservation,
+        deltas=deltas
+    )
+
+    return response_utils.ClosingStreamingResponse(
+        stream_ai_response(stream, first_delta),
+        on_close=stream.close,
+        media_type='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
 
 
 @router.get(
@@ -83,45 +430,170 @@ async def get_minimum_tokens_for_ai():
         ),
         status.HTTP_400_BAD_REQUEST: response_utils.get_error_response_schema(
             user_exceptions.UserTokensNotEnoughError.detail
+        ),
+        status.HTTP_503_SERVICE_UNAVAILABLE: (
+            response_utils.get_error_response_schema(
+                service_exceptions.ServiceBusyError.detail
+            )
         )
     }
 )
 async def compose_essay(
     request: ai_schema.ComposeEssayRequest,
-    user_payload: dict = Depends(auth_utils.get_token_payload)
+    background_tasks: BackgroundTasks,
+    user_payload: dict = Depends(auth_utils.get_token_payload),
+    session: AsyncSession = Depends(get_session)
 ):
     await auth_utils.validate_token_type(
         token_type=settings.auth_jwt.access_token_name,
         payload=user_payload
     )
     user_id = int(user_payload['sub'])
-    user = await user_repository.get_user(user_id=user_id)
 
-    if user.tokens_count < settings.ai.min_tokens_for_essay:
-        raise user_exceptions.UserTokensNotEnoughError()
+    cache_key = essay_cache_utils.get_cache_key(request)
+    cached_essay = await essay_cache_utils.get_cached_essay(cache_key)
+
+    if cached_essay:
+        await balance_cache_utils.debit_tokens(
+            user_id=user_id,
+            amount=cached_essay.tokens,
+            min_tokens_count=settings.ai.min_tokens_for_essay,
+            session=session
+        )
+        metrics_utils.tokens_debited.inc(
+            Model.GPT_4O_MINI.value,
+            amount=cached_essay.tokens
+        )
+        usage_utils.record_usage(
+            user_id=user_id,
+            model=Model.GPT_4O_MINI,
+            endpoint='compose_essay',
+            completion_tokens=cached_essay.tokens
+        )
+        return ai_schema.ComposeEssayResponse(
+            text=cached_essay.text,
+            tokens=cached_essay.tokens
+        )
+
+    reservation = await balance_cache_utils.reserve_tokens(
+        user_id=user_id,
+        amount=settings.ai.min_tokens_for_essay,
+        session=session
+    )
+    await session.commit()
+    tokens_count = 0
 
-    request_text = await ai_utils.get_request_for_compose_essay(request)
+    try:
+        essay = await ai_utils.compose_essay(request, user_id=user_id)
+        tokens_count = essay.tokens
+    finally:
+        with anyio.CancelScope(shield=True):
+            await balance_cache_utils.settle_tokens(
+                reservation,
+                tokens_count,
+                session
+            )
+            await session.commit()
+        metrics_utils.tokens_debited.inc(
+            Model.GPT_4O_MINI.value,
+            amount=tokens_count
+        )
 
-    ai_response = await ai_utils.ai_request(
-        request=request_text,
+    usage_utils.record_usage(
+        user_id=user_id,
         model=Model.GPT_4O_MINI,
-        system_text=settings.ai.system_text_for_essay
+        endpoint='compose_essay',
+        completion_tokens=tokens_count,
+        prompt_tokens=essay.prompt_tokens,
+        upstream_latency=essay.latency
     )
 
-    tokens_count = await ai_utils.get_tokens_count(
-        text=ai_response,
-        model=Model.GPT_4O_MINI
+    background_tasks.add_task(
+        essay_cache_utils.store_essay,
+        cache_key=cache_key,
+        text=essay.text,
+        tokens=essay.tokens
     )
-    new_user_tokens_count = user.tokens_count - tokens_count
 
-    await user_repository.update_user_tokens_count(
-        user_id,
-        new_user_tokens_count
+    return essay
+
+
+@router.post(
+    '/compose/essay/jobs/',
+    response_model=ai_schema.EssayJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    responses={
+        **response_utils.combine_error_responses(
+            auth_utils.get_auth_responses()
+        ),
+        status.HTTP_400_BAD_REQUEST: response_utils.get_error_response_schema(
+            user_exceptions.UserTokensNotEnoughError.detail
+        )
+    },
+    description=(
+        "Queue an essay for background generation. "
+        "Poll the returned job until it is done or failed."
+    )
+)
+async def submit_essay_job(
+    request: ai_schema.ComposeEssayRequest,
+    user_payload: dict = Depends(auth_utils.get_token_payload),
+    session: AsyncSession = Depends(get_session)
+):
+    await auth_utils.validate_token_type(
+        token_type=settings.auth_jwt.access_token_name,
+        payload=user_payload
     )
+    user_id = int(user_payload['sub'])
 
-    return ai_schema.ComposeEssayResponse(
-        text=ai_response,
-        tokens=tokens_count
+    # The hold and the job are committed together
+    hold_id = await user_repository.reserve_user_tokens(
+        user_id=user_id,
+        amount=settings.ai.min_tokens_for_essay,
+        session=session
+    )
+    job = await essay_job_repository.create_essay_job(
+        user_id=user_id,
+        hold_id=hold_id,
+        request=request,
+        session=session
+    )
+    await session.commit()
+
+    # The hold is taken in the database, the cached balance is stale
+    balance_cache_utils.invalidate(user_id)
+
+    return job
+
+
+@router.get(
+    '/compose/essay/jobs/{job_id}/',
+    response_model=ai_schema.EssayJobResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        **response_utils.combine_error_responses(
+            auth_utils.get_auth_responses()
+        ),
+        status.HTTP_404_NOT_FOUND: response_utils.get_error_response_schema(
+            ai_exceptions.EssayJobNotFoundError.detail
+        )
+    },
+    description="Get status and result of a queued essay."
+)
+async def get_essay_job(
+    job_id: int,
+    user_payload: dict = Depends(auth_utils.get_token_payload),
+    session: AsyncSession = Depends(get_session)
+):
+    await auth_utils.validate_token_type(
+        token_type=settings.auth_jwt.access_token_name,
+        payload=user_payload
+    )
+
+    return await essay_job_repository.get_essay_job(
+        job_id=job_id,
+        user_id=int(user_payload['sub']),
+        session=session
     )
 
 
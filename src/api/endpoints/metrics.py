@@ -0,0 +1,53 @@
+import secrets
+
+from fastapi import APIRouter, Header
+from fastapi.responses import PlainTextResponse
+
+from src.core.config import settings
+from src.database.database import get_pool_stats
+from src.exceptions import token_exceptions
+from src.utils import (
+    auth_utils,
+    balance_cache_utils,
+    metrics_utils,
+    rate_limit_utils,
+    usage_utils
+)
+from src.utils.ai import ai_utils, router_utils, upstream_utils
+
+
+router = APIRouter(
+    tags=['metrics']
+)
+
+
+@router.get(
+    '/metrics',
+    response_class=PlainTextResponse,
+    include_in_schema=False
+)
+async def get_metrics(authorization: str = Header('')):
+    token = settings.metrics.token
+    if not token or not secrets.compare_digest(
+        authorization.encode(),
+        f'Bearer {token}'.encode()
+    ):
+        raise token_exceptions.InvalidTokenError()
+
+    return PlainTextResponse(
+        metrics_utils.render_metrics({
+            'db_pool': get_pool_stats(),
+            'ai_single_flight': ai_utils.get_single_flight_stats(),
+            'ai_admission': ai_utils.get_admission_stats(),
+            'ai_backends': router_utils.get_router_stats(),
+            'ai_upstream_connections': upstream_utils.get_connection_stats(),
+            'rate_limit': rate_limit_utils.get_rate_limit_stats(),
+            'verified_tokens_cache': (
+                auth_utils.get_verified_tokens_cache_stats()
+            ),
+            'password_hashing': auth_utils.get_password_hashing_stats(),
+            'usage_ledger': usage_utils.get_usage_ledger_stats(),
+            'balance_cache': balance_cache_utils.get_balance_cache_stats()
+        }),
+        media_type='text/plain; version=0.0.4'
+    )
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Header, status
+
+from src.schemas import profiling_schema
+from src.utils import profiling_utils
+from src.exceptions import token_exceptions
+from src.utils.response_utils import get_error_response_schema
+
+
+router = APIRouter(
+    prefix='/admin/profiling',
+    tags=['admin']
+)
+
+
+@router.put(
+    '/',
+    response_model=profiling_schema.ProfilingState,
+    status_code=status.HTTP_200_OK,
+    responses={
+        token_exceptions.InvalidTokenError.status_code: (
+            get_error_response_schema(
+                token_exceptions.InvalidTokenError.detail
+            )
+        )
+    },
+    description=(
+        "Turn request profiling on or off. Needs an `X-Profile` header "
+        "signed with the profiling secret."
+    )
+)
+async def set_profiling_state(
+    state: profiling_schema.ProfilingState,
+    x_profile: str = Header('')
+):
+    if not profiling_utils.verify_profile_header(x_profile):
+        raise token_exceptions.InvalidTokenError()
+
+    profiling_utils.profiling_state = state
+    return state
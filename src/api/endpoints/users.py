@@ -1,13 +1,26 @@
-from fastapi import APIRouter, status, Depends
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    Header,
+    Response,
+    status
+)
 
-from src.utils import auth_utils
+from src.utils import auth_utils, balance_cache_utils
 from src.repositories import user_repository as crud
 from src.schemas import user_schema, token_schema
-from src.exceptions import user_exceptions, token_exceptions
+from src.exceptions import (
+    user_exceptions,
+    token_exceptions,
+    service_exceptions
+)
 from src.core.config import settings
 from src.utils.response_utils import (
     get_error_response_schema,
-    combine_error_responses
+    combine_error_responses,
+    get_etag,
+    etag_matches
 )
 
 
@@ -26,12 +39,17 @@ router = APIRouter(
             get_error_response_schema(
                 user_exceptions.UserAlreadyExistsError.detail
             )
+        ),
+        service_exceptions.ServiceBusyError.status_code: (
+            get_error_response_schema(
+                service_exceptions.ServiceBusyError.detail
+            )
         )
     },
     description="Register a new user."
 )
 async def register_user(user_in: user_schema.UserCreate):
-    hashed_password = auth_utils.hash_password(user_in.password)
+    hashed_password = await auth_utils.hash_password(user_in.password)
 
     user_to_add_in_db = user_schema.UserToAddInDB(
         **user_in.model_dump(exclude={'password'}),
@@ -46,6 +64,16 @@ async def register_user(user_in: user_schema.UserCreate):
     return user_schema.UserCreateResponse.model_validate(response)
 
 
+async def rehash_user_password(user_id: int, password: str) -> None:
+    try:
+        hashed_password = await auth_utils.hash_password(password)
+    except service_exceptions.ServiceBusyError:
+        # The hash is upgraded on one of the next logins
+        return
+
+    await crud.update_user_password(user_id, hashed_password)
+
+
 @router.post(
     '/login/',
     response_model=token_schema.TokenResponse,
@@ -59,24 +87,39 @@ async def register_user(user_in: user_schema.UserCreate):
             get_error_response_schema(
                 user_exceptions.UserInvalidCredentialsError.detail
             )
+        ),
+        service_exceptions.ServiceBusyError.status_code: (
+            get_error_response_schema(
+                service_exceptions.ServiceBusyError.detail
+            )
         )
     },
     description="Login a user."
 )
-async def login_user(user_in: user_schema.UserLogin):
+async def login_user(
+    user_in: user_schema.UserLogin,
+    background_tasks: BackgroundTasks
+):
     if not user_in.email and not user_in.username:
         raise user_exceptions.UserNotEnoughDataError()
     elif user_in.email:
-        user = await crud.get_user(email=user_in.email)
+        user = await crud.get_user_credentials(email=user_in.email)
     elif user_in.username:
-        user = await crud.get_user(username=user_in.username)
+        user = await crud.get_user_credentials(username=user_in.username)
 
-    if not user or not auth_utils.validate_password(
+    if not user or not await auth_utils.validate_password(
         password=user_in.password,
         hashed_password=user.hashed_password
     ):
         raise user_exceptions.UserInvalidCredentialsError()
     else:
+        if auth_utils.password_needs_rehash(user.hashed_password):
+            background_tasks.add_task(
+                rehash_user_password,
+                user.id,
+                user_in.password
+            )
+
         access_token = auth_utils.encode_jwt(
             payload={
                 'type': settings.auth_jwt.access_token_name,
@@ -142,6 +185,69 @@ async def refresh_access_token(
     return token_schema.AccessTokenResponse(access_token=access_token)
 
 
+@router.get(
+    '/me/',
+    response_model=user_schema.UserStatusResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        **combine_error_responses({
+            status.HTTP_401_UNAUTHORIZED: [
+                user_exceptions.UserNotAuthenticatedError,
+                token_exceptions.InvalidTokenError,
+                token_exceptions.TokenExpiredError,
+                token_exceptions.InvalidTokenTypeError
+            ],
+        }),
+        status.HTTP_304_NOT_MODIFIED: {
+            'description': 'Status matches the If-None-Match ETag'
+        }
+    },
+    description=(
+        "Get user's tokens count, what the user can do and the minimum "
+        "costs in one request. Send the returned ETag as If-None-Match "
+        "to get 304 while nothing changed."
+    )
+)
+async def get_user_status(
+    if_none_match: str | None = Header(None),
+    payload: dict = Depends(auth_utils.get_token_payload)
+):
+    await auth_utils.validate_token_type(
+        token_type=settings.auth_jwt.access_token_name,
+        payload=payload
+    )
+
+    tokens_count = await balance_cache_utils.get_tokens_count(
+        int(payload['sub'])
+    )
+
+    user_status = user_schema.UserStatusResponse(
+        tokens_count=tokens_count,
+        can_compose_essay=tokens_count >= settings.ai.min_tokens_for_essay,
+        can_request_chatgpt=tokens_count >= settings.ai.min_tokens_for_ai,
+        min_tokens_for_essay=settings.ai.min_tokens_for_essay,
+        min_tokens_for_ai=settings.ai.min_tokens_for_ai
+    )
+    content = user_status.model_dump_json().encode()
+    headers = {
+        'ETag': get_etag(content),
+        # Cached copies must be revalidated, the balance changes often
+        'Cache-Control': 'private, no-cache'
+    }
+
+    if etag_matches(if_none_match, headers['ETag']):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers=headers
+        )
+
+    return Response(
+        content=content,
+        media_type='application/json',
+        headers=headers
+    )
+
+
 @router.get(
     '/me/tokens/',
     response_model=user_schema.UserTokensResponse,
@@ -173,10 +279,11 @@ async def get_user_tokens(
     except token_exceptions.TokenExpiredError:
         raise token_exceptions.TokenExpiredError()
 
-    user_id = int(payload.get('sub'))
-    user = await crud.get_user(user_id=user_id)
+    tokens_count = await balance_cache_utils.get_tokens_count(
+        int(payload.get('sub'))
+    )
 
-    return user_schema.UserTokensResponse(tokens_count=user.tokens_count)
+    return user_schema.UserTokensResponse(tokens_count=tokens_count)
 
 
 @router.get(
@@ -210,10 +317,11 @@ async def can_compose_essay(
     except token_exceptions.TokenExpiredError:
         raise token_exceptions.TokenExpiredError()
 
-    user_id = int(payload.get('sub'))
-    user = await crud.get_user(user_id=user_id)
+    tokens_count = await balance_cache_utils.get_tokens_count(
+        int(payload.get('sub'))
+    )
 
-    return user.tokens_count >= settings.ai.min_tokens_for_essay
+    return tokens_count >= settings.ai.min_tokens_for_essay
 
 
 @router.get(
@@ -247,7 +355,8 @@ async def can_request_chatgpt(
     except token_exceptions.TokenExpiredError:
         raise token_exceptions.TokenExpiredError()
 
-    user_id = int(payload.get('sub'))
-    user = await crud.get_user(user_id=user_id)
+    tokens_count = await balance_cache_utils.get_tokens_count(
+        int(payload.get('sub'))
+    )
 
-    return user.tokens_count >= settings.ai.min_tokens_for_ai
+    return tokens_count >= settings.ai.min_tokens_for_ai
@@ -1,7 +1,11 @@
 from src.api.endpoints.users import router as auth_router
 from src.api.endpoints.ai import router as ai_router
+from src.api.endpoints.metrics import router as metrics_router
+from src.api.endpoints.profiling import router as profiling_router
 
 routers = [
     auth_router,
     ai_router,
+    metrics_router,
+    profiling_router,
 ]
@@ -1,8 +1,10 @@
 from typing import List
 from pathlib import Path
-from pydantic import BaseModel, Field
+from pydantic import AliasChoices, BaseModel, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from src.enums.ai_models import Model
+
 
 BASE_DIR = Path(__file__).parent.parent.parent
 
@@ -48,6 +50,18 @@ class DatabaseSettings(BaseSettings):
 
     echo: bool = False
 
+    # Defaults are the SQLAlchemy ones
+    pool_size: int = 5
+    max_overflow: int = 10
+    # Seconds to wait for a free connection before an error
+    pool_timeout: float = 30
+    # Seconds after which connections are reopened, -1 disables it
+    pool_recycle: int = -1
+    pool_pre_ping: bool = False
+    # Prepared statements cached per connection, 0 disables the cache
+    # (required behind pgbouncer in transaction mode)
+    statement_cache_size: int = 100
+
     @property
     def url(self) -> str:
         return (
@@ -58,19 +72,73 @@ class DatabaseSettings(BaseSettings):
         )
 
 
-class AuthJWT(BaseModel):
+class AuthJWT(BaseSettings):
+    model_config = SettingsConfigDict(
+        env_file='.env',
+        env_prefix='JWT_',
+        extra='ignore'
+    )
+
     keys_dir: Path = BASE_DIR / 'certs'
 
+    # Key pair with kid "default". More keys can be put in keys_dir as
+    # `<kid>.private.pem` and `<kid>.public.pem`
     private_key_path: Path = keys_dir / 'private.pem'
     public_key_path: Path = keys_dir / 'public.pem'
 
+    # Key that signs new tokens. Tokens are verified by the key from
+    # their `kid` header, so old keys stay valid during rotation
+    signing_kid: str = 'default'
+
     access_token_name: str = 'access_token'
     refresh_token_name: str = 'refresh_token'
 
     access_token_expire_minutes: int = 15
     refresh_token_expire_minutes: int = 43200  # 30 days
 
-    algorithm: str = 'RS256'
+    # Verified tokens kept in memory until their own expiration
+    verified_tokens_cache_size: int = 10000
+
+
+class PasswordHashing(BaseSettings):
+    model_config = SettingsConfigDict(
+        env_file='.env',
+        env_prefix='PASSWORD_HASHING_',
+        extra='ignore'
+    )
+
+    # Changing the cost re-hashes stored passwords on the next login
+    bcrypt_rounds: int = Field(
+        default=12,
+        validation_alias=AliasChoices(
+            'PASSWORD_HASHING_BCRYPT_ROUNDS',
+            'BCRYPT_ROUNDS'
+        )
+    )
+
+    # bcrypt releases the GIL, so threads hash in parallel
+    # without blocking the event loop
+    workers: int = 2
+    # Hashing jobs allowed to wait for a free worker
+    max_queue: int = 64
+
+
+class AIBackend(BaseModel):
+    """
+    OpenAI-compatible upstream serving some of the logical models
+    """
+    name: str
+    # None means the OpenAI API
+    base_url: str | None = None
+    # None means AI.openai_api_key
+    api_key: str | None = None
+    # None means AI.proxy, an empty string disables the proxy
+    proxy: str | None = None
+
+    # Logical model -> model name on this backend
+    models: dict[Model, str] = {model: model.value for model in Model}
+    # tiktoken encoding for local token counting, None means by model
+    encoding: str | None = None
 
 
 class AI(BaseSettings):
@@ -79,6 +147,39 @@ class AI(BaseSettings):
     proxy: str
     openai_api_key: str
 
+    # JSON list of AIBackend, the order is the failover priority
+    backends: List[AIBackend] = Field(
+        default=[AIBackend(name='openai')],
+        alias='AI_BACKENDS'
+    )
+    # Attempts per request, spread over healthy backends first
+    router_max_attempts: int = 3
+    # Share of the latency EWMA given to the newest request
+    router_latency_alpha: float = 0.2
+    # Backend is skipped for router_cooldown_seconds once this share of
+    # its last router_error_window requests failed
+    router_error_window: int = 20
+    router_error_threshold: float = 0.5
+    router_cooldown_seconds: float = 30
+
+    # Upstream HTTP client, http2 needs the `h2` package
+    upstream_http2: bool = False
+    upstream_max_connections: int = 100
+    upstream_max_keepalive_connections: int = 20
+    # Idle connections are kept open this long to skip TLS handshakes
+    upstream_keepalive_expiry: float = 60
+    upstream_connect_timeout: float = 10
+    upstream_read_timeout: float = 120
+    upstream_write_timeout: float = 10
+    upstream_pool_timeout: float = 10
+
+    # Upstream calls in flight, callers over the limit wait in a queue
+    # shared fairly between users and get 503 if they can't start
+    # within upstream_queue_timeout_seconds
+    upstream_max_concurrency: int = 64
+    upstream_max_queue: int = 256
+    upstream_queue_timeout_seconds: float = 10
+
     system_text_for_essay: str = """
     Ни в коем случае не используй слова, кроме русских.
 
@@ -88,13 +189,176 @@ class AI(BaseSettings):
     min_tokens_for_essay: int = 750
     min_tokens_for_ai: int = 500
 
+    # Requests in one batch and how many of them go upstream at once
+    batch_max_requests: int = 16
+    batch_concurrency: int = 4
+
+    # Identical concurrent requests share one upstream call
+    single_flight: bool = True
+
+    # Encoding for models unknown to tiktoken
+    default_encoding: str = 'o200k_base'
+    # Longer texts are encoded in a worker thread
+    tokenizer_thread_threshold: int = 8192
+
+    # Holds older than this are considered abandoned and refunded
+    token_hold_ttl_minutes: int = 30
+
+
+class EssayCache(BaseSettings):
+    model_config = SettingsConfigDict(
+        env_file='.env',
+        env_prefix='ESSAY_CACHE_',
+        extra='ignore'
+    )
+
+    enabled: bool = True
+    ttl_minutes: int = 7 * 24 * 60
+    # Different essays stored per request before answers are reused
+    variants: int = 3
+
+    # Requests kept in the in-memory tier
+    memory_size: int = 1024
+    # Essays kept in the database, the oldest are evicted first
+    max_entries: int = 50000
+    # Eviction runs once per this many stored essays
+    prune_every: int = 100
+
+
+class EssayJobs(BaseSettings):
+    model_config = SettingsConfigDict(
+        env_file='.env',
+        env_prefix='ESSAY_JOBS_',
+        extra='ignore'
+    )
+
+    # In-process workers generating queued essays
+    workers: int = 2
+    poll_interval_seconds: float = 1.0
+
+    max_attempts: int = 3
+    # Multiplied by the attempt number
+    retry_delay_seconds: int = 10
+    # Running jobs not finished in time are claimed again
+    job_timeout_minutes: int = 10
+
+    # Finished jobs are kept for polling this long
+    result_ttl_minutes: int = 24 * 60
+
+
+class RateLimitRule(BaseModel):
+    # Requests per second and the burst allowed on top of it
+    rate: float
+    burst: int
+
+
+class RateLimit(BaseSettings):
+    model_config = SettingsConfigDict(
+        env_file='.env',
+        env_prefix='RATE_LIMIT_',
+        extra='ignore'
+    )
+
+    # Off until the proxies in front are known, see trusted_proxies
+    enabled: bool = False
+    # Per user limits by route group, JSON in RATE_LIMIT_GROUPS
+    groups: dict[str, RateLimitRule] = {
+        'ai': RateLimitRule(rate=1, burst=10),
+        'users_me': RateLimitRule(rate=5, burst=30),
+        'auth': RateLimitRule(rate=0.2, burst=10),
+        'default': RateLimitRule(rate=20, burst=100)
+    }
+    # Limit of anonymous requests per address, one address may be
+    # shared by several users
+    ip_multiplier: float = 5
+    # Proxies in front of the app that append to X-Forwarded-For. The
+    # client address is the entry added by the outermost of them, the
+    # entries on its left are set by the client
+    trusted_proxies: int = 0
+
+    # Buckets kept in memory, the least recently used are dropped
+    max_keys: int = 100000
+
+
+class BalanceCache(BaseSettings):
+    model_config = SettingsConfigDict(
+        env_file='.env',
+        env_prefix='BALANCE_CACHE_',
+        extra='ignore'
+    )
+
+    # Off: every check and debit goes to the database. Only for a single
+    # process, several would each let a user overspend by their own
+    # unwritten debits.
+    enabled: bool = False
+    # Balances changed by other processes are seen after this
+    ttl_seconds: float = 5
+    # Local debits are written every interval, or earlier once a user
+    # has this many unwritten tokens. Both bound what a crash loses.
+    flush_interval_seconds: float = 1.0
+    max_pending_tokens: int = 5000
+    max_users: int = 100000
+
+
+class UsageLedger(BaseSettings):
+    model_config = SettingsConfigDict(
+        env_file='.env',
+        env_prefix='USAGE_LEDGER_',
+        extra='ignore'
+    )
+
+    enabled: bool = True
+    # Events are written in batches of this size or once per interval
+    batch_size: int = 500
+    flush_interval_seconds: float = 2.0
+    # Events over this are dropped while the database is unavailable
+    max_buffered: int = 50000
+
+
+class Profiling(BaseSettings):
+    model_config = SettingsConfigDict(
+        env_file='.env',
+        env_prefix='PROFILING_',
+        extra='ignore'
+    )
+
+    # Signs X-Profile headers, the middleware isn't added without it
+    secret: str = ''
+    # Profile every request from the start, can be toggled at runtime
+    enabled: bool = False
+
+    dir: Path = BASE_DIR / 'profiles'
+    # The oldest profiles are deleted above this
+    max_profiles: int = 100
+    # Seconds between stack samples
+    interval: float = 0.001
+
+
+class Metrics(BaseSettings):
+    model_config = SettingsConfigDict(
+        env_file='.env',
+        env_prefix='METRICS_',
+        extra='ignore'
+    )
+
+    # Scrapers send it as a bearer token, /metrics is closed without it
+    token: str = ''
+
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file='.env', extra='ignore')
 
     auth_jwt: AuthJWT = AuthJWT()
+    password_hashing: PasswordHashing = PasswordHashing()
     database_settings: DatabaseSettings = DatabaseSettings()
     ai: AI = AI()
+    essay_cache: EssayCache = EssayCache()
+    essay_jobs: EssayJobs = EssayJobs()
+    rate_limit: RateLimit = RateLimit()
+    balance_cache: BalanceCache = BalanceCache()
+    usage_ledger: UsageLedger = UsageLedger()
+    profiling: Profiling = Profiling()
+    metrics: Metrics = Metrics()
     cors: Cors = Cors()
 
 
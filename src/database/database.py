@@ -1,14 +1,86 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from typing import AsyncGenerator, AsyncIterator
+from contextlib import asynccontextmanager
+from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    AsyncSession,
+    create_async_engine,
+    async_sessionmaker
+)
 from .models import Base
+from .pool import InstrumentedAsyncQueuePool
 
 from src.core.config import settings
 
 
 engine = create_async_engine(
     settings.database_settings.url,
-    echo=settings.database_settings.echo
+    echo=settings.database_settings.echo,
+    poolclass=InstrumentedAsyncQueuePool,
+    pool_size=settings.database_settings.pool_size,
+    max_overflow=settings.database_settings.max_overflow,
+    pool_timeout=settings.database_settings.pool_timeout,
+    pool_recycle=settings.database_settings.pool_recycle,
+    pool_pre_ping=settings.database_settings.pool_pre_ping,
+    connect_args={
+        # SQLAlchemy and asyncpg keep separate prepared statement caches
+        'prepared_statement_cache_size': (
+            settings.database_settings.statement_cache_size
+        ),
+        'statement_cache_size': settings.database_settings.statement_cache_size
+    }
 )
-async_session = async_sessionmaker(bind=engine)
+# Requests commit mid-way, loaded rows must stay readable afterwards
+async_session = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+
+async def get_session() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Request-scoped unit of work shared by the repository calls of one
+    request. The connection is checked out on the first query and
+    returned on every commit, so commit before waiting on something slow
+    like the upstream LLM. Committed when the endpoint returns, rolled
+    back if it raises.
+    """
+    async with async_session() as session:
+        yield session
+        await session.commit()
+
+
+@asynccontextmanager
+async def use_session(
+    session: AsyncSession | None = None
+) -> AsyncIterator[AsyncSession]:
+    """
+    Joins the request's session, its owner commits. Without one opens
+    a session of its own that is committed on exit.
+    """
+    if session is not None:
+        yield session
+        return
+
+    async with async_session() as session:
+        yield session
+        await session.commit()
+
+
+@asynccontextmanager
+async def use_connection(
+    session: AsyncSession | None = None
+) -> AsyncIterator[AsyncSession | AsyncConnection]:
+    """
+    For Core reads: joins the request's session or takes a bare
+    connection, which skips the ORM session setup
+    """
+    if session is not None:
+        yield session
+        return
+
+    async with engine.connect() as connection:
+        yield connection
+
+
+def get_pool_stats() -> dict:
+    return engine.pool.get_stats()
 
 
 async def init_db():
@@ -1,4 +1,16 @@
+from datetime import date, datetime
+from sqlalchemy import (
+    BigInteger,
+    ForeignKey,
+    Index,
+    String,
+    UniqueConstraint,
+    func
+)
 from sqlalchemy.orm import Mapped, DeclarativeBase, mapped_column
+from sqlalchemy.dialects.postgresql import JSONB
+
+from src.enums.essay_job_status import EssayJobStatus
 
 
 class Base(DeclarativeBase):
@@ -15,3 +27,99 @@ class User(Base):
     hashed_password: Mapped[bytes] = mapped_column()
     tokens_count: Mapped[int] = mapped_column(default=1500)
     tg_id: Mapped[int] = mapped_column(unique=True, nullable=True)
+
+
+class TokenHold(Base):
+    """
+    Tokens reserved for an in-flight AI request, already debited from
+    the user balance and refunded on settlement
+    """
+    __tablename__ = 'token_holds'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey('users.id', ondelete='CASCADE'),
+        index=True
+    )
+    amount: Mapped[int] = mapped_column()
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+
+
+class EssayCacheEntry(Base):
+    __tablename__ = 'essay_cache'
+    __table_args__ = (UniqueConstraint('cache_key', 'variant'),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+
+    cache_key: Mapped[str] = mapped_column(String(64))
+    variant: Mapped[int] = mapped_column()
+    text: Mapped[str] = mapped_column()
+    tokens: Mapped[int] = mapped_column()
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+
+
+class EssayJob(Base):
+    __tablename__ = 'essay_jobs'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey('users.id', ondelete='CASCADE'),
+        index=True
+    )
+    hold_id: Mapped[int] = mapped_column()
+    request: Mapped[dict] = mapped_column(JSONB)
+
+    status: Mapped[EssayJobStatus] = mapped_column(
+        default=EssayJobStatus.PENDING,
+        index=True
+    )
+    attempts: Mapped[int] = mapped_column(default=0)
+    run_after: Mapped[datetime] = mapped_column(server_default=func.now())
+    started_at: Mapped[datetime] = mapped_column(nullable=True)
+    finished_at: Mapped[datetime] = mapped_column(nullable=True)
+
+    text: Mapped[str] = mapped_column(nullable=True)
+    tokens: Mapped[int] = mapped_column(nullable=True)
+    error: Mapped[str] = mapped_column(nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+
+
+class UsageEvent(Base):
+    """
+    Append-only record of one billed AI answer. Kept after the user is
+    deleted, so there is no foreign key.
+    """
+    __tablename__ = 'usage_events'
+    __table_args__ = (Index(None, 'user_id', 'created_at'),)
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+
+    user_id: Mapped[int] = mapped_column()
+    model: Mapped[str] = mapped_column(String(64))
+    endpoint: Mapped[str] = mapped_column(String(64))
+    prompt_tokens: Mapped[int] = mapped_column(nullable=True)
+    completion_tokens: Mapped[int] = mapped_column()
+    # Seconds, None when nothing was sent upstream
+    upstream_latency: Mapped[float] = mapped_column(nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+
+
+class UsageDaily(Base):
+    """
+    Usage events summed per day, updated together with the inserts
+    """
+    __tablename__ = 'usage_daily'
+
+    day: Mapped[date] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(primary_key=True)
+    model: Mapped[str] = mapped_column(String(64), primary_key=True)
+    endpoint: Mapped[str] = mapped_column(String(64), primary_key=True)
+
+    requests: Mapped[int] = mapped_column()
+    prompt_tokens: Mapped[int] = mapped_column()
+    completion_tokens: Mapped[int] = mapped_column()
+    upstream_latency: Mapped[float] = mapped_column()
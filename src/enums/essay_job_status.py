@@ -0,0 +1,8 @@
+from enum import Enum
+
+
+class EssayJobStatus(Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
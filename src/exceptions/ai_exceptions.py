@@ -0,0 +1,9 @@
+from fastapi import HTTPException, status
+
+
+class EssayJobNotFoundError(HTTPException):
+    status_code = status.HTTP_404_NOT_FOUND
+    detail = 'Essay job not found'
+
+    def __init__(self):
+        super().__init__(status_code=self.status_code, detail=self.detail)
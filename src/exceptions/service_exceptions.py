@@ -0,0 +1,25 @@
+from fastapi import HTTPException, status
+
+
+class ServiceBusyError(HTTPException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    detail = 'Service is busy, try again later'
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__(
+            status_code=self.status_code,
+            detail=self.detail,
+            headers={'Retry-After': str(retry_after)}
+        )
+
+
+class TooManyRequestsError(HTTPException):
+    status_code = status.HTTP_429_TOO_MANY_REQUESTS
+    detail = 'Too many requests, try again later'
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__(
+            status_code=self.status_code,
+            detail=self.detail,
+            headers={'Retry-After': str(retry_after)}
+        )
@@ -1,22 +1,59 @@
 import uvicorn
 
-from fastapi import FastAPI
+from datetime import timedelta
+from fastapi import FastAPI, Request
+from fastapi.exception_handlers import http_exception_handler
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.exceptions import HTTPException
 from contextlib import asynccontextmanager
 
 from src.api.routers import routers
 from src.database.database import init_db
+from src.repositories import user_repository
+from src.utils import (
+    balance_cache_utils,
+    jwt_key_utils,
+    metrics_utils,
+    profiling_utils,
+    rate_limit_utils,
+    usage_utils
+)
+from src.utils.ai import tokenizer_utils, router_utils
 from src.core.config import settings
+from src.workers import essay_workers
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    jwt_key_utils.get_signing_key()
+    tokenizer_utils.init_tokenizers()
+    router_utils.open_router()
+    await user_repository.release_stale_token_holds(
+        older_than=timedelta(minutes=settings.ai.token_hold_ttl_minutes)
+    )
+    essay_workers.start_essay_workers()
+    usage_utils.usage_ledger.start()
+    balance_cache_utils.balance_cache.start()
     yield
+    await essay_workers.stop_essay_workers()
+    await balance_cache_utils.balance_cache.stop()
+    await usage_utils.usage_ledger.stop()
+    await router_utils.close_router()
 
 
 app = FastAPI(lifespan=lifespan)
 
+# Without a secret profiling can't be turned on, so it costs nothing
+if settings.profiling.secret:
+    app.add_middleware(profiling_utils.ProfilingMiddleware)
+
+# Added before CORS, so rejections still carry CORS headers
+app.add_middleware(
+    rate_limit_utils.RateLimitMiddleware,
+    backend=rate_limit_utils.rate_limit_backend
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors.allowed_origins,
@@ -25,6 +62,15 @@ app.add_middleware(
     allow_headers=settings.cors.allowed_headers,
 )
 
+# Outermost, so the latency includes rejected requests too
+app.add_middleware(metrics_utils.MetricsMiddleware)
+
+
+@app.exception_handler(HTTPException)
+async def count_http_exception(request: Request, error: HTTPException):
+    metrics_utils.errors.inc(type(error).__name__)
+    return await http_exception_handler(request, error)
+
 for router in routers:
     router.prefix = "/api" + router.prefix
     app.include_router(router=router)
@@ -0,0 +1,99 @@
+from datetime import timedelta
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.postgresql import insert
+
+from src.database.database import async_session, engine
+from src.database.models import EssayCacheEntry
+from src.schemas import ai_schema
+
+
+async def get_essay_variants(
+    cache_key: str,
+    ttl: timedelta
+) -> list[ai_schema.CachedEssay]:
+    async with engine.connect() as connection:
+        rows = await connection.execute(
+            select(
+                EssayCacheEntry.variant,
+                EssayCacheEntry.text,
+                EssayCacheEntry.tokens,
+                EssayCacheEntry.created_at
+            )
+            .where(
+                EssayCacheEntry.cache_key == cache_key,
+                EssayCacheEntry.created_at > func.now() - ttl
+            )
+            .order_by(EssayCacheEntry.variant)
+        )
+
+        return [
+            ai_schema.CachedEssay(**row._mapping)
+            for row in rows
+        ]
+
+
+async def add_essay_variant(
+    cache_key: str,
+    variant: int,
+    text: str,
+    tokens: int,
+    ttl: timedelta
+) -> ai_schema.CachedEssay | None:
+    """
+    Returns None if a concurrent request already stored this variant.
+    An expired entry not pruned yet is replaced.
+    """
+    statement = insert(EssayCacheEntry).values(
+        cache_key=cache_key,
+        variant=variant,
+        text=text,
+        tokens=tokens
+    )
+
+    async with async_session() as session:
+        entry = await session.scalar(
+            statement
+            .on_conflict_do_update(
+                index_elements=['cache_key', 'variant'],
+                set_={
+                    # A new id, pruning takes the lowest ids as the oldest
+                    'id': statement.excluded.id,
+                    'text': statement.excluded.text,
+                    'tokens': statement.excluded.tokens,
+                    'created_at': func.now()
+                },
+                where=EssayCacheEntry.created_at <= func.now() - ttl
+            )
+            .returning(EssayCacheEntry)
+        )
+        essay = None
+        if entry is not None:
+            essay = ai_schema.CachedEssay.model_validate(entry)
+
+        await session.commit()
+
+        return essay
+
+
+async def prune_essay_cache(ttl: timedelta, max_entries: int) -> None:
+    """
+    Deletes expired essays and the oldest ones over `max_entries`
+    """
+    newest_evicted_id = (
+        select(EssayCacheEntry.id)
+        .order_by(EssayCacheEntry.id.desc())
+        .offset(max_entries)
+        .limit(1)
+        .scalar_subquery()
+    )
+
+    async with async_session() as session:
+        await session.execute(
+            delete(EssayCacheEntry)
+            .where(
+                (EssayCacheEntry.created_at <= func.now() - ttl) |
+                (EssayCacheEntry.id <= newest_evicted_id)
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
@@ -0,0 +1,155 @@
+from datetime import timedelta
+from sqlalchemy import select, insert, update, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.database import async_session, use_session
+from src.database.models import EssayJob
+from src.enums.essay_job_status import EssayJobStatus
+from src.schemas import ai_schema
+from src.exceptions import ai_exceptions
+
+
+async def create_essay_job(
+    user_id: int,
+    hold_id: int,
+    request: ai_schema.ComposeEssayRequest,
+    session: AsyncSession | None = None
+) -> ai_schema.EssayJobResponse:
+    async with use_session(session) as session:
+        job = await session.scalar(
+            insert(EssayJob)
+            .values(
+                user_id=user_id,
+                hold_id=hold_id,
+                request=request.model_dump()
+            )
+            .returning(EssayJob)
+        )
+
+        return ai_schema.EssayJobResponse.model_validate(job)
+
+
+async def get_essay_job(
+    job_id: int,
+    user_id: int,
+    session: AsyncSession | None = None
+) -> ai_schema.EssayJobResponse:
+    async with use_session(session) as session:
+        job = await session.scalar(
+            select(EssayJob).where(
+                EssayJob.id == job_id,
+                EssayJob.user_id == user_id
+            )
+        )
+
+        if not job:
+            raise ai_exceptions.EssayJobNotFoundError()
+
+        return ai_schema.EssayJobResponse.model_validate(job)
+
+
+async def claim_essay_job(timeout: timedelta) -> ai_schema.EssayJob | None:
+    """
+    Takes the oldest due job. Jobs of crashed workers are taken again
+    after `timeout`. SKIP LOCKED lets workers claim jobs concurrently.
+    """
+    claimable_job_id = (
+        select(EssayJob.id)
+        .where(
+            (
+                (EssayJob.status == EssayJobStatus.PENDING) &
+                (EssayJob.run_after <= func.now())
+            ) |
+            (
+                (EssayJob.status == EssayJobStatus.RUNNING) &
+                (EssayJob.started_at < func.now() - timeout)
+            )
+        )
+        .order_by(EssayJob.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+
+    async with async_session() as session:
+        job = await session.scalar(
+            update(EssayJob)
+            .where(EssayJob.id == claimable_job_id)
+            .values(
+                status=EssayJobStatus.RUNNING,
+                attempts=EssayJob.attempts + 1,
+                started_at=func.now()
+            )
+            .returning(EssayJob)
+            .execution_options(synchronize_session=False)
+        )
+        claimed_job = None
+        if job is not None:
+            claimed_job = ai_schema.EssayJob.model_validate(job)
+
+        await session.commit()
+
+        return claimed_job
+
+
+async def complete_essay_job(job_id: int, text: str, tokens: int) -> None:
+    async with async_session() as session:
+        await session.execute(
+            update(EssayJob)
+            .where(EssayJob.id == job_id)
+            .values(
+                status=EssayJobStatus.DONE,
+                text=text,
+                tokens=tokens,
+                error=None,
+                finished_at=func.now()
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+
+
+async def retry_essay_job(job_id: int, error: str, delay: timedelta) -> None:
+    async with async_session() as session:
+        await session.execute(
+            update(EssayJob)
+            .where(EssayJob.id == job_id)
+            .values(
+                status=EssayJobStatus.PENDING,
+                error=error,
+                run_after=func.now() + delay
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+
+
+async def fail_essay_job(job_id: int, error: str) -> None:
+    async with async_session() as session:
+        await session.execute(
+            update(EssayJob)
+            .where(EssayJob.id == job_id)
+            .values(
+                status=EssayJobStatus.FAILED,
+                error=error,
+                finished_at=func.now()
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+
+
+async def delete_finished_essay_jobs(older_than: timedelta) -> None:
+    async with async_session() as session:
+        await session.execute(
+            delete(EssayJob)
+            .where(
+                EssayJob.status.in_([
+                    EssayJobStatus.DONE,
+                    EssayJobStatus.FAILED
+                ]),
+                EssayJob.finished_at < func.now() - older_than
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
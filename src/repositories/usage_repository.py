@@ -0,0 +1,84 @@
+from datetime import date
+from sqlalchemy import insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from src.database.database import async_session
+from src.database.models import UsageEvent, UsageDaily
+
+
+def get_daily_rows(events: list[dict]) -> list[dict]:
+    rows = {}
+
+    for event in events:
+        key = (
+            event['created_at'].date(),
+            event['user_id'],
+            event['model'],
+            event['endpoint']
+        )
+        row = rows.get(key)
+
+        if row is None:
+            row = rows[key] = {
+                'day': key[0],
+                'user_id': key[1],
+                'model': key[2],
+                'endpoint': key[3],
+                'requests': 0,
+                'prompt_tokens': 0,
+                'completion_tokens': 0,
+                'upstream_latency': 0.0
+            }
+
+        row['requests'] += 1
+        row['prompt_tokens'] += event['prompt_tokens'] or 0
+        row['completion_tokens'] += event['completion_tokens']
+        row['upstream_latency'] += event['upstream_latency'] or 0
+
+    # The same lock order in every process avoids upsert deadlocks
+    return [rows[key] for key in sorted(rows)]
+
+
+async def add_usage_events(events: list[dict]) -> None:
+    """
+    Inserts the events in one multi-row INSERT and adds them to the
+    daily rollups in the same transaction
+    """
+    statement = pg_insert(UsageDaily).values(get_daily_rows(events))
+    excluded = statement.excluded
+
+    async with async_session() as session:
+        await session.execute(insert(UsageEvent).values(events))
+        await session.execute(
+            statement.on_conflict_do_update(
+                index_elements=['day', 'user_id', 'model', 'endpoint'],
+                set_={
+                    'requests': UsageDaily.requests + excluded.requests,
+                    'prompt_tokens': (
+                        UsageDaily.prompt_tokens + excluded.prompt_tokens
+                    ),
+                    'completion_tokens': (
+                        UsageDaily.completion_tokens +
+                        excluded.completion_tokens
+                    ),
+                    'upstream_latency': (
+                        UsageDaily.upstream_latency +
+                        excluded.upstream_latency
+                    )
+                }
+            )
+        )
+        await session.commit()
+
+
+async def get_daily_usage(
+    user_id: int,
+    since: date
+) -> list[UsageDaily]:
+    async with async_session() as session:
+        rows = await session.scalars(
+            select(UsageDaily)
+            .where(UsageDaily.user_id == user_id, UsageDaily.day >= since)
+            .order_by(UsageDaily.day)
+        )
+        return list(rows)
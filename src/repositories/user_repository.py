@@ -1,36 +1,136 @@
-from sqlalchemy import select
+from datetime import timedelta
+from typing import NamedTuple
+from sqlalchemy import (
+    Column,
+    Integer,
+    LargeBinary,
+    MetaData,
+    String,
+    Table,
+    bindparam,
+    column,
+    delete,
+    exists,
+    func,
+    insert,
+    literal,
+    select,
+    update,
+    values
+)
+from sqlalchemy.schema import CreateTable, DropTable
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.database import async_session
-from src.database.models import User
+from src.database.database import async_session, use_connection, use_session
+from src.database.models import User, TokenHold, EssayJob
 from src.schemas import user_schema
 from src.exceptions import user_exceptions
+from src.utils import metrics_utils
 
 
+class UserCredentials(NamedTuple):
+    id: int
+    hashed_password: bytes
+
+
+# Hot reads select only the needed columns through a Core connection:
+# no ORM instances, identity map or session. The statements are built
+# once and asyncpg reuses their prepared statements per connection.
+select_credentials_by_email = (
+    select(User.id, User.hashed_password)
+    .where(User.email == bindparam('login'))
+)
+select_credentials_by_username = (
+    select(User.id, User.hashed_password)
+    .where(User.username == bindparam('login'))
+)
+select_tokens_count = (
+    select(User.tokens_count).where(User.id == bindparam('user_id'))
+)
+
+# Staging table of import_users, lives until the end of the transaction
+users_import = Table(
+    'users_import',
+    MetaData(),
+    Column('username', String),
+    Column('email', String),
+    Column('hashed_password', LargeBinary),
+    prefixes=['TEMPORARY']
+)
+
+
+@metrics_utils.timed(metrics_utils.user_repository_duration)
 async def create_user(
-    user_to_add: user_schema.UserToAddInDB
+    user_to_add: user_schema.UserToAddInDB,
+    session: AsyncSession | None = None
 ) -> user_schema.UserCreateResponse:
-    async with async_session() as session:
-        user_exists = await session.scalar(
-            select(User).where(
-                (User.email == user_to_add.email) |
-                (User.username == user_to_add.username)
-            )
+    """
+    One INSERT: a taken username or email is reported by the unique
+    constraints, so concurrent sign-ups can't both pass a check
+    """
+    async with use_session(session) as session:
+        user_id = await session.scalar(
+            pg_insert(User)
+            .values(**user_to_add.model_dump())
+            .on_conflict_do_nothing()
+            .returning(User.id)
         )
 
-        if user_exists:
-            raise user_exceptions.UserAlreadyExistsError()
+    if user_id is None:
+        raise user_exceptions.UserAlreadyExistsError()
 
-        session.add(User(**user_to_add.model_dump()))
+    return user_schema.UserCreateResponse.model_validate(user_to_add)
 
-        await session.commit()
-        return user_schema.UserCreateResponse.model_validate(user_to_add)
 
+@metrics_utils.timed(metrics_utils.user_repository_duration)
+async def import_users(
+    users: list[user_schema.UserToAddInDB],
+    session: AsyncSession | None = None
+) -> int:
+    """
+    Bulk registration: the users are copied into a temporary table with
+    COPY and inserted in one statement. Users whose username or email is
+    taken are skipped. Returns the number of imported users.
+    """
+    async with use_session(session) as session:
+        connection = await session.connection()
+        await connection.execute(CreateTable(users_import))
+
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            users_import.name,
+            records=[
+                (user.username, user.email, user.hashed_password)
+                for user in users
+            ],
+            columns=users_import.columns.keys()
+        )
+
+        # Column defaults (e.g. the starting balance) are added by SQLAlchemy
+        result = await connection.execute(
+            pg_insert(User)
+            .from_select(
+                ['username', 'email', 'hashed_password'],
+                select(users_import)
+            )
+            .on_conflict_do_nothing()
+            .returning(User.id)
+        )
+        imported = len(result.all())
+
+        await connection.execute(DropTable(users_import))
 
+    return imported
+
+
+@metrics_utils.timed(metrics_utils.user_repository_duration)
 async def get_user(
     user_id: int | None = None,
-    email: str | None = None, username: str | None = None
+    email: str | None = None, username: str | None = None,
+    session: AsyncSession | None = None
 ) -> User | None:
-    async with async_session() as session:
+    async with use_session(session) as session:
         if user_id:
             user = await session.scalar(
                 select(User).where(User.id == user_id)
@@ -50,10 +150,212 @@ async def get_user(
         return user
 
 
-async def update_user_tokens_count(user_id: int, tokens_count: int) -> None:
+@metrics_utils.timed(metrics_utils.user_repository_duration)
+async def get_user_credentials(
+    email: str | None = None,
+    username: str | None = None,
+    session: AsyncSession | None = None
+) -> UserCredentials | None:
+    """
+    Returns None if there is no such user, so login can't tell
+    a wrong login from a wrong password
+    """
+    if email:
+        statement = select_credentials_by_email
+    else:
+        statement = select_credentials_by_username
+
+    async with use_connection(session) as connection:
+        result = await connection.execute(
+            statement,
+            {'login': email or username}
+        )
+        row = result.first()
+
+    return UserCredentials(*row) if row else None
+
+
+@metrics_utils.timed(metrics_utils.user_repository_duration)
+async def get_user_tokens_count(
+    user_id: int,
+    session: AsyncSession | None = None
+) -> int:
+    async with use_connection(session) as connection:
+        tokens_count = await connection.scalar(
+            select_tokens_count,
+            {'user_id': user_id}
+        )
+
+    if tokens_count is None:
+        raise user_exceptions.UserNotFoundError()
+
+    return tokens_count
+
+
+@metrics_utils.timed(metrics_utils.user_repository_duration)
+async def update_user_password(user_id: int, hashed_password: bytes) -> None:
     async with async_session() as session:
-        user = await session.scalar(
-            select(User).where(User.id == user_id)
+        await session.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(hashed_password=hashed_password)
+            .execution_options(synchronize_session=False)
         )
-        user.tokens_count = tokens_count
+        await session.commit()
+
+
+@metrics_utils.timed(metrics_utils.user_repository_duration)
+async def debit_user_tokens(
+    user_id: int,
+    amount: int,
+    min_tokens_count: int,
+    session: AsyncSession | None = None
+) -> int:
+    """
+    Debits an already known amount if the balance is at least
+    `min_tokens_count`. Returns the new balance.
+    """
+    async with use_session(session) as session:
+        new_tokens_count = await session.scalar(
+            update(User)
+            .where(User.id == user_id, User.tokens_count >= min_tokens_count)
+            .values(tokens_count=User.tokens_count - amount)
+            .returning(User.tokens_count)
+            .execution_options(synchronize_session=False)
+        )
+
+    if new_tokens_count is None:
+        raise user_exceptions.UserTokensNotEnoughError()
+
+    return new_tokens_count
+
+
+@metrics_utils.timed(metrics_utils.user_repository_duration)
+async def apply_user_token_debits(
+    debits: list[tuple[int, int]]
+) -> dict[int, int]:
+    """
+    Subtracts (user_id, amount) debits in one UPDATE ... FROM (VALUES)
+    statement. Returns the new balances by user id.
+    """
+    debits_values = values(
+        column('user_id', Integer),
+        column('amount', Integer),
+        name='debits'
+    ).data(debits)
+    statement = (
+        update(User)
+        .where(User.id == debits_values.c.user_id)
+        .values(tokens_count=User.tokens_count - debits_values.c.amount)
+        .returning(User.id, User.tokens_count)
+        .execution_options(synchronize_session=False)
+    )
+
+    async with async_session() as session:
+        result = await session.execute(statement)
+        balances = dict(result.tuples().all())
+        await session.commit()
+
+    return balances
+
+
+@metrics_utils.timed(metrics_utils.user_repository_duration)
+async def reserve_user_tokens(
+    user_id: int,
+    amount: int,
+    session: AsyncSession | None = None
+) -> int:
+    """
+    Debits `amount` tokens if the balance covers them and records
+    a hold in the same statement. Returns the hold id.
+    """
+    debit = (
+        update(User)
+        .where(User.id == user_id, User.tokens_count >= amount)
+        .values(tokens_count=User.tokens_count - amount)
+        .returning(User.id)
+        .cte('debit')
+    )
+    statement = (
+        insert(TokenHold)
+        .from_select(
+            ['user_id', 'amount'],
+            select(debit.c.id, literal(amount))
+        )
+        .returning(TokenHold.id)
+    )
+
+    async with use_session(session) as session:
+        hold_id = await session.scalar(statement)
+
+    if hold_id is None:
+        raise user_exceptions.UserTokensNotEnoughError()
+
+    return hold_id
+
+
+@metrics_utils.timed(metrics_utils.user_repository_duration)
+async def settle_user_tokens(
+    hold_id: int,
+    tokens_count: int,
+    session: AsyncSession | None = None
+) -> int | None:
+    """
+    Closes the hold and applies the real spending: the reserved amount
+    is refunded and `tokens_count` is debited in one statement.
+    Returns the new balance or None if the hold was already settled.
+    """
+    hold = (
+        delete(TokenHold)
+        .where(TokenHold.id == hold_id)
+        .returning(TokenHold.user_id, TokenHold.amount)
+        .cte('hold')
+    )
+    statement = (
+        update(User)
+        .where(User.id == hold.c.user_id)
+        .values(tokens_count=User.tokens_count + hold.c.amount - tokens_count)
+        .returning(User.tokens_count)
+        .execution_options(synchronize_session=False)
+    )
+
+    async with use_session(session) as session:
+        new_tokens_count = await session.scalar(statement)
+
+    return new_tokens_count
+
+
+@metrics_utils.timed(metrics_utils.user_repository_duration)
+async def release_stale_token_holds(older_than: timedelta) -> None:
+    """
+    Refunds holds left behind by requests that never settled
+    (e.g. the worker crashed mid-request). Holds of queued essay jobs
+    live as long as the job and are settled by the essay workers.
+    """
+    released = (
+        delete(TokenHold)
+        .where(
+            TokenHold.created_at < func.now() - older_than,
+            ~exists().where(EssayJob.hold_id == TokenHold.id)
+        )
+        .returning(TokenHold.user_id, TokenHold.amount)
+        .cte('released')
+    )
+    refunds = (
+        select(
+            released.c.user_id,
+            func.sum(released.c.amount).label('amount')
+        )
+        .group_by(released.c.user_id)
+        .cte('refunds')
+    )
+    statement = (
+        update(User)
+        .where(User.id == refunds.c.user_id)
+        .values(tokens_count=User.tokens_count + refunds.c.amount)
+        .execution_options(synchronize_session=False)
+    )
+
+    async with async_session() as session:
+        await session.execute(statement)
         await session.commit()
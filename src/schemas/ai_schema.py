@@ -1,5 +1,8 @@
-from pydantic import BaseModel, Field
+from datetime import datetime
+from pydantic import BaseModel, ConfigDict, Field
 from src.enums.ai_models import Model
+from src.enums.essay_job_status import EssayJobStatus
+from src.core.config import settings
 
 
 class AIRequest(BaseModel):
@@ -15,6 +18,43 @@ class AIResponse(BaseModel):
     tokens: int
 
 
+class AIBatchRequest(BaseModel):
+    requests: list[AIRequest] = Field(
+        min_length=1,
+        max_length=settings.ai.batch_max_requests,
+        description="Requests answered concurrently, results keep the order"
+    )
+
+
+class AIBatchItemResponse(BaseModel):
+    text: str | None = None
+    tokens: int = 0
+    error: str | None = None
+
+
+class AIBatchResponse(BaseModel):
+    results: list[AIBatchItemResponse]
+    tokens: int
+
+
+class AICompletion(BaseModel):
+    text: str
+    completion_tokens: int | None = None
+    prompt_tokens: int | None = None
+    # Backend that answered, its tokenizer counts the tokens
+    backend: str | None = None
+    # Seconds the upstream call took
+    latency: float | None = None
+
+
+class AIStreamChunk(BaseModel):
+    text: str
+
+
+class AIStreamEnd(BaseModel):
+    tokens: int
+
+
 class MinimumTokensForAIResponse(BaseModel):
     tokens: int
 
@@ -43,5 +83,40 @@ class ComposeEssayResponse(AIResponse):
     pass
 
 
+class EssayCompletion(ComposeEssayResponse):
+    prompt_tokens: int | None = None
+    latency: float | None = None
+
+
+class CachedEssay(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    variant: int
+    text: str
+    tokens: int
+    created_at: datetime
+
+
+class EssayJob(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    user_id: int
+    hold_id: int
+    request: ComposeEssayRequest
+    status: EssayJobStatus
+    attempts: int
+
+
+class EssayJobResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    status: EssayJobStatus
+    text: str | None = None
+    tokens: int | None = None
+    error: str | None = None
+
+
 class MinimumTokensForComposeEssayResponse(BaseModel):
     tokens: int
@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+
+
+class ProfilingState(BaseModel):
+    enabled: bool
+    # Only requests with paths starting with it are profiled
+    path_prefix: str = ''
+    # Profiling turns off after this many requests, None for no limit
+    requests: int | None = None
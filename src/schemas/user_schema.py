@@ -28,3 +28,11 @@ class UserLogin(UserBase):
 
 class UserTokensResponse(BaseModel):
     tokens_count: int = Field(examples=[100])
+
+
+class UserStatusResponse(BaseModel):
+    tokens_count: int = Field(examples=[1500])
+    can_compose_essay: bool
+    can_request_chatgpt: bool
+    min_tokens_for_essay: int = Field(examples=[750])
+    min_tokens_for_ai: int = Field(examples=[500])
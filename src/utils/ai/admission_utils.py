@@ -0,0 +1,151 @@
+import math
+import time
+import heapq
+import asyncio
+
+from typing import AsyncIterator, Hashable
+from contextlib import asynccontextmanager
+
+from src.core.config import settings
+from src.exceptions import service_exceptions
+
+
+class AdmissionController:
+    """
+    Limits concurrent upstream calls. Waiting requests are served by
+    weighted fair queuing over users, so one heavy user can't starve
+    the others, and are rejected with 503 when they can't start
+    before their deadline.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue: int,
+        timeout: float
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+
+        self.active = 0
+        self.waiting = 0
+        # (virtual finish tag, sequence number, future)
+        self.waiters: list[tuple[float, int, asyncio.Future]] = []
+        self.sequence = 0
+        self.virtual_time = 0.0
+        self.user_finish_tags: dict[Hashable, float] = {}
+
+        # Average time a call holds its slot
+        self.service_time = 1.0
+
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_deadline = 0
+
+    def get_expected_wait(self) -> float:
+        return (self.waiting + 1) * self.service_time / self.max_concurrency
+
+    def reject(self, expected_wait: float) -> None:
+        raise service_exceptions.ServiceBusyError(
+            retry_after=max(math.ceil(expected_wait), 1)
+        )
+
+    async def acquire(
+        self,
+        user_id: Hashable = None,
+        weight: float = 1.0
+    ) -> None:
+        if self.active < self.max_concurrency and not self.waiting:
+            self.active += 1
+            self.admitted += 1
+            return
+
+        expected_wait = self.get_expected_wait()
+
+        if self.waiting >= self.max_queue:
+            self.rejected_queue_full += 1
+            self.reject(expected_wait)
+        if expected_wait > self.timeout:
+            # Fails fast instead of waiting for a sure timeout
+            self.rejected_deadline += 1
+            self.reject(expected_wait)
+
+        finish_tag = max(
+            self.virtual_time,
+            self.user_finish_tags.get(user_id, 0.0)
+        ) + 1 / weight
+        self.user_finish_tags[user_id] = finish_tag
+
+        future = asyncio.get_running_loop().create_future()
+        self.sequence += 1
+        heapq.heappush(self.waiters, (finish_tag, self.sequence, future))
+        self.waiting += 1
+
+        try:
+            await asyncio.wait_for(future, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.rejected_deadline += 1
+            self.reject(self.get_expected_wait())
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over right when the caller left
+                self.release()
+            raise
+        finally:
+            if not future.done() or future.cancelled():
+                self.waiting -= 1
+
+        self.admitted += 1
+
+    def release(self) -> None:
+        while self.waiters:
+            finish_tag, _, future = heapq.heappop(self.waiters)
+
+            if future.done():
+                # The waiter timed out or was cancelled
+                continue
+
+            # The slot goes to the waiter, `active` stays the same
+            self.virtual_time = finish_tag
+            self.waiting -= 1
+            future.set_result(None)
+            return
+
+        self.active -= 1
+        self.user_finish_tags.clear()
+
+    @asynccontextmanager
+    async def admit(
+        self,
+        user_id: Hashable = None,
+        weight: float = 1.0
+    ) -> AsyncIterator[None]:
+        await self.acquire(user_id, weight)
+        start_time = time.monotonic()
+
+        try:
+            yield
+        finally:
+            self.service_time = (
+                0.2 * (time.monotonic() - start_time) +
+                0.8 * self.service_time
+            )
+            self.release()
+
+    def get_stats(self) -> dict:
+        return {
+            'active': self.active,
+            'waiting': self.waiting,
+            'admitted': self.admitted,
+            'rejected_queue_full': self.rejected_queue_full,
+            'rejected_deadline': self.rejected_deadline,
+            'service_time': self.service_time
+        }
+
+
+admission = AdmissionController(
+    max_concurrency=settings.ai.upstream_max_concurrency,
+    max_queue=settings.ai.upstream_max_queue,
+    timeout=settings.ai.upstream_queue_timeout_seconds
+)
@@ -1,42 +1,143 @@
-import httpx
-import tiktoken
+import time
+import asyncio
 
-from openai import AsyncOpenAI
+from typing import AsyncGenerator
 
 from src.schemas import ai_schema
 from src.enums.ai_models import Model
 from src.core.config import settings
+from src.utils import metrics_utils
+from src.utils.ai import tokenizer_utils, router_utils
+from src.utils.ai.admission_utils import admission
+from src.utils.single_flight_utils import SingleFlight
 
 
-http_client = httpx.AsyncClient(
-    proxy=settings.ai.proxy,
-    transport=httpx.HTTPTransport(
-        local_address='0.0.0.0'
-    )
-)
-
-client = AsyncOpenAI(
-    api_key=settings.ai.openai_api_key,
-    http_client=http_client
-)
+ai_requests_flight = SingleFlight()
 
 
-async def ai_request(
-    request: str, model: Model,
+def get_messages_list(
+    request: str,
     system_text: str | None = None
-) -> str:
+) -> list[dict]:
     messages_list = []
 
     if system_text:
         messages_list.append({"role": "system", "content": system_text})
     messages_list.append({"role": 'user', "content": request})
 
-    chat_completion = await client.chat.completions.create(
-        messages=messages_list,
-        model=model.value,
-        max_tokens=1000
+    return messages_list
+
+
+async def ai_request(
+    request: str, model: Model,
+    system_text: str | None = None,
+    user_id: int | None = None
+) -> ai_schema.AICompletion:
+    """
+    Identical concurrent requests share one upstream call,
+    each caller still bills the returned usage itself.
+    Only calls that really go upstream pass admission control.
+    """
+    async def admitted_completion() -> ai_schema.AICompletion:
+        # The slot is held by the shared call itself, so it is counted
+        # until the upstream answers even if the caller that started it
+        # is gone
+        async with admission.admit(user_id):
+            return await request_completion(request, model, system_text)
+
+    if not settings.ai.single_flight:
+        return await admitted_completion()
+
+    return await ai_requests_flight.run(
+        (model, system_text, request),
+        admitted_completion
     )
-    return chat_completion.choices[0].message.content
+
+
+async def request_completion(
+    request: str, model: Model,
+    system_text: str | None = None
+) -> ai_schema.AICompletion:
+    async def create_completion(backend, upstream_model: str):
+        return await backend.client.chat.completions.create(
+            messages=get_messages_list(request, system_text),
+            model=upstream_model,
+            max_tokens=1000
+        )
+
+    start_time = time.perf_counter()
+    backend, chat_completion = await router_utils.get_router().request(
+        model,
+        create_completion
+    )
+    latency = time.perf_counter() - start_time
+    metrics_utils.ai_request_duration.observe(
+        latency,
+        model.value,
+        backend.name
+    )
+    usage = chat_completion.usage
+
+    return ai_schema.AICompletion(
+        text=chat_completion.choices[0].message.content,
+        completion_tokens=usage.completion_tokens if usage else None,
+        prompt_tokens=usage.prompt_tokens if usage else None,
+        backend=backend.name,
+        latency=latency
+    )
+
+
+def get_single_flight_stats() -> dict:
+    return ai_requests_flight.get_stats()
+
+
+def get_admission_stats() -> dict:
+    return admission.get_stats()
+
+
+async def ai_stream_request(
+    request: str, model: Model,
+    system_text: str | None = None,
+    user_id: int | None = None
+) -> AsyncGenerator[ai_schema.AICompletion, None]:
+    """
+    Yields response deltas as soon as the upstream sends them.
+    The last item carries upstream usage if the upstream reports it.
+    The admission slot is held until the stream ends.
+    """
+    async def create_stream(backend, upstream_model: str):
+        return await backend.client.chat.completions.create(
+            messages=get_messages_list(request, system_text),
+            model=upstream_model,
+            max_tokens=1000,
+            stream=True,
+            stream_options={'include_usage': True}
+        )
+
+    async with admission.admit(user_id):
+        start_time = time.perf_counter()
+
+        # Failover is possible only until the stream is open
+        backend, stream = await router_utils.get_router().request(
+            model,
+            create_stream
+        )
+
+        async with stream:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield ai_schema.AICompletion(
+                        text=chunk.choices[0].delta.content,
+                        backend=backend.name
+                    )
+                if chunk.usage:
+                    yield ai_schema.AICompletion(
+                        text='',
+                        completion_tokens=chunk.usage.completion_tokens,
+                        prompt_tokens=chunk.usage.prompt_tokens,
+                        backend=backend.name,
+                        latency=time.perf_counter() - start_time
+                    )
 
 
 async def get_request_for_compose_essay(
@@ -53,11 +154,52 @@ async def get_request_for_compose_essay(
     return text
 
 
-async def get_tokens_count(text: str, model: Model) -> int:
-    result = 0
+async def compose_essay(
+    request: ai_schema.ComposeEssayRequest,
+    user_id: int | None = None
+) -> ai_schema.EssayCompletion:
+    request_text = await get_request_for_compose_essay(request)
+
+    ai_response = await ai_request(
+        request=request_text,
+        model=Model.GPT_4O_MINI,
+        system_text=settings.ai.system_text_for_essay,
+        user_id=user_id
+    )
+
+    tokens_count = await get_tokens_count(
+        text=ai_response.text,
+        model=Model.GPT_4O_MINI,
+        completion_tokens=ai_response.completion_tokens,
+        backend=ai_response.backend
+    )
+    return ai_schema.EssayCompletion(
+        text=ai_response.text,
+        tokens=tokens_count,
+        prompt_tokens=ai_response.prompt_tokens,
+        latency=ai_response.latency
+    )
+
+
+async def get_tokens_count(
+    text: str, model: Model,
+    completion_tokens: int | None = None,
+    backend: str | None = None
+) -> int:
+    """
+    Prefers the upstream usage, the text is encoded locally only
+    when the upstream didn't report it
+    """
+    if completion_tokens is not None:
+        return completion_tokens
+
+    encoding = tokenizer_utils.get_encoding(model, backend)
 
-    if model == Model.GPT_4O_MINI:
-        encoding = tiktoken.encoding_for_model(model.value)
-        result = len(encoding.encode(text))
+    if len(text) > settings.ai.tokenizer_thread_threshold:
+        with metrics_utils.tokens_count_duration.time('thread'):
+            return len(
+                await asyncio.to_thread(encoding.encode_ordinary, text)
+            )
 
-    return result
+    with metrics_utils.tokens_count_duration.time('local'):
+        return len(encoding.encode_ordinary(text))
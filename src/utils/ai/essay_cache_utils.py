@@ -0,0 +1,124 @@
+import json
+import time
+import random
+import hashlib
+
+from datetime import timedelta
+
+from src.schemas import ai_schema
+from src.core.config import settings
+from src.repositories import essay_cache_repository
+from src.utils.cache_utils import LRUCache
+
+
+essays_cache = LRUCache(maxsize=settings.essay_cache.memory_size)
+stored_essays_count = 0
+
+
+def normalize_text(text: str | None) -> str:
+    return ' '.join((text or '').split()).casefold()
+
+
+def get_cache_key(request: ai_schema.ComposeEssayRequest) -> str:
+    """
+    Requests that differ only in case and whitespace share the key
+    """
+    normalized_request = json.dumps([
+        normalize_text(request.theme),
+        normalize_text(request.author),
+        request.word_count,
+        normalize_text(request.additional_info)
+    ], ensure_ascii=False)
+
+    return hashlib.sha256(normalized_request.encode()).hexdigest()
+
+
+def get_ttl() -> timedelta:
+    return timedelta(minutes=settings.essay_cache.ttl_minutes)
+
+
+def remember_variants(
+    cache_key: str,
+    variants: list[ai_schema.CachedEssay]
+) -> None:
+    expires_at = time.time() + get_ttl().total_seconds()
+
+    if variants:
+        # The memory tier must not outlive the oldest variant
+        oldest_created_at = min(variant.created_at for variant in variants)
+        expires_at = min(
+            expires_at,
+            oldest_created_at.timestamp() + get_ttl().total_seconds()
+        )
+
+    essays_cache.set(cache_key, variants, expires_at=expires_at)
+
+
+async def get_essay_variants(cache_key: str) -> list[ai_schema.CachedEssay]:
+    variants = essays_cache.get(cache_key)
+
+    if variants is None:
+        variants = await essay_cache_repository.get_essay_variants(
+            cache_key=cache_key,
+            ttl=get_ttl()
+        )
+        remember_variants(cache_key, variants)
+
+    return variants
+
+
+async def get_cached_essay(
+    cache_key: str
+) -> ai_schema.CachedEssay | None:
+    """
+    Returns a random stored essay once all variants of the request
+    are generated, until then requests go to the upstream
+    """
+    if not settings.essay_cache.enabled:
+        return None
+
+    variants = await get_essay_variants(cache_key)
+
+    if len(variants) < settings.essay_cache.variants:
+        return None
+
+    return random.choice(variants)
+
+
+async def store_essay(cache_key: str, text: str, tokens: int) -> None:
+    global stored_essays_count
+
+    if not settings.essay_cache.enabled:
+        return
+
+    variants = await get_essay_variants(cache_key)
+
+    if len(variants) >= settings.essay_cache.variants:
+        return
+
+    # Pruning may leave gaps, the lowest free number is taken
+    taken_variants = {essay.variant for essay in variants}
+    variant = min(
+        set(range(settings.essay_cache.variants)) - taken_variants
+    )
+
+    essay = await essay_cache_repository.add_essay_variant(
+        cache_key=cache_key,
+        variant=variant,
+        text=text,
+        tokens=tokens,
+        ttl=get_ttl()
+    )
+    if essay is None:
+        # Another request stored this variant, reload from the database
+        essays_cache.delete(cache_key)
+        return
+
+    remember_variants(cache_key, [*variants, essay])
+
+    stored_essays_count += 1
+    if stored_essays_count % settings.essay_cache.prune_every == 0:
+        await essay_cache_repository.prune_essay_cache(
+            ttl=get_ttl(),
+            max_entries=settings.essay_cache.max_entries
+        )
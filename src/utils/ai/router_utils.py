@@ -0,0 +1,193 @@
+import time
+import openai
+
+from collections import deque
+from typing import Awaitable, Callable, TypeVar
+
+from src.enums.ai_models import Model
+from src.core.config import settings, AIBackend
+from src.utils.ai import tokenizer_utils, upstream_utils
+
+
+T = TypeVar('T')
+
+# Errors worth retrying on another backend, others (bad request,
+# authentication) would fail the same way everywhere
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.RateLimitError,
+    openai.InternalServerError
+)
+
+
+class Backend:
+    """
+    Upstream client with rolling latency and error rate
+    """
+
+    def __init__(
+        self,
+        name: str,
+        client: openai.AsyncOpenAI,
+        models: dict[Model, str]
+    ):
+        self.name = name
+        self.client = client
+        self.models = models
+
+        self.latency: float | None = None
+        self.results: deque[bool] = deque(
+            maxlen=settings.ai.router_error_window
+        )
+        self.unhealthy_until = 0.0
+
+    @property
+    def error_rate(self) -> float:
+        if not self.results:
+            return 0.0
+        return self.results.count(False) / len(self.results)
+
+    def is_healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+    def record_success(self, latency: float) -> None:
+        alpha = settings.ai.router_latency_alpha
+
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = alpha * latency + (1 - alpha) * self.latency
+        self.results.append(True)
+
+    def record_failure(self) -> None:
+        self.results.append(False)
+
+        if (
+            len(self.results) >= self.results.maxlen // 2 and
+            self.error_rate >= settings.ai.router_error_threshold
+        ):
+            self.unhealthy_until = (
+                time.monotonic() + settings.ai.router_cooldown_seconds
+            )
+            # Give the backend a clean slate after the cooldown
+            self.results.clear()
+
+    def get_stats(self) -> dict:
+        return {
+            'latency': self.latency,
+            'error_rate': self.error_rate,
+            'healthy': self.is_healthy()
+        }
+
+
+class ModelRouter:
+    """
+    Sends each request to the fastest healthy backend serving the model
+    and fails over to the next one on retryable errors
+    """
+
+    def __init__(self, backends: list[Backend]):
+        self.backends = backends
+
+    def get_candidates(self, model: Model) -> list[Backend]:
+        backends = [
+            backend for backend in self.backends
+            if model in backend.models
+        ]
+        healthy = [backend for backend in backends if backend.is_healthy()]
+        unhealthy = [backend for backend in backends if backend not in healthy]
+
+        # Backends without measurements go first to get one, the stable
+        # sort keeps the configured priority among equal latencies
+        healthy.sort(key=lambda backend: backend.latency or 0.0)
+        unhealthy.sort(key=lambda backend: backend.unhealthy_until)
+
+        return healthy + unhealthy
+
+    async def request(
+        self,
+        model: Model,
+        call: Callable[[Backend, str], Awaitable[T]]
+    ) -> tuple[Backend, T]:
+        """
+        Runs `call(backend, upstream_model)`, trying the candidates in
+        order. Returns the backend that answered with its result.
+        """
+        candidates = self.get_candidates(model)
+
+        if not candidates:
+            raise ValueError(f'No AI backend serves {model.value}')
+
+        last_error = None
+        for attempt in range(settings.ai.router_max_attempts):
+            backend = candidates[attempt % len(candidates)]
+            start_time = time.perf_counter()
+
+            try:
+                result = await call(backend, backend.models[model])
+            except RETRYABLE_ERRORS as error:
+                backend.record_failure()
+                last_error = error
+                continue
+
+            backend.record_success(time.perf_counter() - start_time)
+            return backend, result
+
+        raise last_error
+
+    def get_stats(self) -> dict[str, dict]:
+        return {
+            backend.name: backend.get_stats()
+            for backend in self.backends
+        }
+
+    async def close(self) -> None:
+        for backend in self.backends:
+            await backend.client.close()
+
+
+router: ModelRouter | None = None
+
+
+def create_backend(config: AIBackend) -> Backend:
+    if config.encoding:
+        tokenizer_utils.register_backend_encoding(
+            backend=config.name,
+            encoding_name=config.encoding
+        )
+
+    return Backend(
+        name=config.name,
+        client=upstream_utils.create_openai_client(config),
+        models=config.models
+    )
+
+
+def open_router() -> ModelRouter:
+    global router
+
+    if router is None:
+        router = ModelRouter([
+            create_backend(config) for config in settings.ai.backends
+        ])
+
+    return router
+
+
+async def close_router() -> None:
+    global router
+
+    if router is not None:
+        await router.close()
+
+    router = None
+
+
+def get_router() -> ModelRouter:
+    # Opened in the app lifespan, lazily for clients that skip it
+    return router or open_router()
+
+
+def get_router_stats() -> dict[str, dict]:
+    return router.get_stats() if router else {}
@@ -0,0 +1,39 @@
+import tiktoken
+
+from src.enums.ai_models import Model
+from src.core.config import settings
+
+
+encodings: dict[Model, tiktoken.Encoding] = {}
+backend_encodings: dict[str, tiktoken.Encoding] = {}
+
+
+def register_backend_encoding(backend: str, encoding_name: str) -> None:
+    backend_encodings[backend] = tiktoken.get_encoding(encoding_name)
+
+
+def get_encoding(
+    model: Model,
+    backend: str | None = None
+) -> tiktoken.Encoding:
+    if backend in backend_encodings:
+        return backend_encodings[backend]
+
+    encoding = encodings.get(model)
+
+    if encoding is None:
+        try:
+            encoding = tiktoken.encoding_for_model(model.value)
+        except KeyError:
+            encoding = tiktoken.get_encoding(settings.ai.default_encoding)
+        encodings[model] = encoding
+
+    return encoding
+
+
+def init_tokenizers() -> None:
+    """
+    Resolves encodings of all models once, so requests never load them
+    """
+    for model in Model:
+        get_encoding(model)
@@ -0,0 +1,84 @@
+import httpx
+
+from collections import defaultdict
+from openai import AsyncOpenAI
+
+from src.core.config import settings, AIBackend
+
+
+connection_stats: defaultdict[str, dict[str, int]] = defaultdict(
+    lambda: {'requests': 0, 'new_connections': 0, 'tls_handshakes': 0}
+)
+
+
+def get_trace(host: str):
+    """
+    httpcore trace callback counting connections opened for a host,
+    requests sent over kept-alive connections open none
+    """
+    host_stats = connection_stats[host]
+
+    async def trace(event_name: str, info: dict) -> None:
+        if event_name.endswith('connect_tcp.complete'):
+            host_stats['new_connections'] += 1
+        elif event_name.endswith('start_tls.complete'):
+            host_stats['tls_handshakes'] += 1
+
+    return trace
+
+
+async def trace_request(request: httpx.Request) -> None:
+    host = request.url.host
+    connection_stats[host]['requests'] += 1
+    request.extensions['trace'] = get_trace(host)
+
+
+def create_http_client(proxy: str | None = None) -> httpx.AsyncClient:
+    transport = httpx.AsyncHTTPTransport(
+        proxy=proxy or None,
+        local_address='0.0.0.0',
+        http2=settings.ai.upstream_http2,
+        limits=httpx.Limits(
+            max_connections=settings.ai.upstream_max_connections,
+            max_keepalive_connections=(
+                settings.ai.upstream_max_keepalive_connections
+            ),
+            keepalive_expiry=settings.ai.upstream_keepalive_expiry
+        )
+    )
+
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(
+            connect=settings.ai.upstream_connect_timeout,
+            read=settings.ai.upstream_read_timeout,
+            write=settings.ai.upstream_write_timeout,
+            pool=settings.ai.upstream_pool_timeout
+        ),
+        event_hooks={'request': [trace_request]}
+    )
+
+
+def create_openai_client(backend: AIBackend) -> AsyncOpenAI:
+    proxy = settings.ai.proxy if backend.proxy is None else backend.proxy
+
+    return AsyncOpenAI(
+        api_key=backend.api_key or settings.ai.openai_api_key,
+        base_url=backend.base_url,
+        http_client=create_http_client(proxy),
+        # Retries are made by the router, possibly on another backend
+        max_retries=0
+    )
+
+
+def get_connection_stats() -> dict[str, dict[str, int]]:
+    return {
+        host: {
+            **host_stats,
+            'reused_requests': max(
+                host_stats['requests'] - host_stats['new_connections'],
+                0
+            )
+        }
+        for host, host_stats in connection_stats.items()
+    }
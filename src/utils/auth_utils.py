@@ -1,6 +1,10 @@
 import jwt
 import bcrypt
+import asyncio
+import hashlib
 
+from typing import Callable, TypeVar
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from datetime import datetime, timedelta, UTC
@@ -8,11 +12,33 @@ from datetime import datetime, timedelta, UTC
 
 from src.core.config import settings
 from src.schemas import token_schema
-from src.exceptions import token_exceptions, user_exceptions
+from src.utils import jwt_key_utils, metrics_utils
+from src.utils.cache_utils import LRUCache
+from src.exceptions import (
+    token_exceptions,
+    user_exceptions,
+    service_exceptions
+)
 
 
+T = TypeVar('T')
+
 http_bearer = HTTPBearer(auto_error=False)
 
+verified_tokens_cache = LRUCache(
+    maxsize=settings.auth_jwt.verified_tokens_cache_size
+)
+
+password_executor = ThreadPoolExecutor(
+    max_workers=settings.password_hashing.workers,
+    thread_name_prefix='password-hashing'
+)
+password_hashing_stats = {
+    'queue_depth': 0,
+    'max_queue_depth': 0,
+    'rejected': 0
+}
+
 
 async def validate_token_type(
     token_type: str,
@@ -29,18 +55,39 @@ async def get_token_payload(
     if not credentials:
         raise user_exceptions.UserNotAuthenticatedError()
 
-    jwt_token = credentials.credentials
+    return verify_token(credentials.credentials)
+
+
+def verify_token(jwt_token: str) -> dict:
+    """Decodes the token, verified payloads are cached until expiry"""
+    token_digest = hashlib.sha256(jwt_token.encode()).digest()
+
+    payload = verified_tokens_cache.get(token_digest)
+    if payload is not None:
+        return payload
 
     try:
-        payload = decode_jwt(token=jwt_token)
-    except jwt.DecodeError:
-        raise token_exceptions.InvalidTokenError()
+        with metrics_utils.jwt_decode_duration.time():
+            payload = decode_jwt(token=jwt_token)
     except jwt.ExpiredSignatureError:
         raise token_exceptions.TokenExpiredError()
+    except jwt.InvalidTokenError:
+        raise token_exceptions.InvalidTokenError()
+
+    if 'exp' in payload:
+        verified_tokens_cache.set(
+            token_digest,
+            payload,
+            expires_at=payload['exp']
+        )
 
     return payload
 
 
+def get_verified_tokens_cache_stats() -> dict:
+    return verified_tokens_cache.get_stats()
+
+
 def get_auth_responses() -> dict[int, HTTPException]:
     """Возвращает стандартный набор ответов для аутентификации"""
     return {
@@ -56,10 +103,10 @@ def get_auth_responses() -> dict[int, HTTPException]:
 def encode_jwt(
     payload: dict,
     expire_minutes: str,
-    private_key: str = settings.auth_jwt.private_key_path.read_text(),
-    algorithm: str = settings.auth_jwt.algorithm,
+    key: jwt_key_utils.JWTKey | None = None,
     expire_timedelta: timedelta | None = None
 ) -> str:
+    key = key or jwt_key_utils.get_signing_key()
     to_encode = payload.copy()
 
     now_time = datetime.now(UTC)
@@ -75,33 +122,77 @@ def encode_jwt(
 
     encoded_jwt = jwt.encode(
         payload=to_encode,
-        key=private_key,
-        algorithm=algorithm
+        key=key.private_key,
+        algorithm=key.algorithm,
+        headers={'kid': key.kid}
     )
     return encoded_jwt
 
 
 def decode_jwt(
     token: str | bytes,
-    public_key: str = settings.auth_jwt.public_key_path.read_text(),
-    algorithm: str = settings.auth_jwt.algorithm
+    key: jwt_key_utils.JWTKey | None = None
 ) -> dict:
+    if key is None:
+        kid = jwt.get_unverified_header(token).get('kid')
+        key = jwt_key_utils.get_verification_key(kid)
+
+        if key is None:
+            raise jwt.DecodeError(f'Unknown key id: {kid}')
+
     decoded_jwt = jwt.decode(
         jwt=token,
-        key=public_key,
-        algorithms=algorithm
+        key=key.public_key,
+        algorithms=[key.algorithm]
     )
     return decoded_jwt
 
 
-def hash_password(
-    password: str
-) -> bytes:
-    salt = bcrypt.gensalt()
+async def run_password_job(function: Callable[..., T], *args) -> T:
+    """
+    Runs bcrypt in the bounded password executor.
+    Jobs over the queue limit are rejected instead of piling up.
+    """
+    limit = (
+        settings.password_hashing.workers +
+        settings.password_hashing.max_queue
+    )
+
+    if password_hashing_stats['queue_depth'] >= limit:
+        password_hashing_stats['rejected'] += 1
+        raise service_exceptions.ServiceBusyError()
+
+    password_hashing_stats['queue_depth'] += 1
+    password_hashing_stats['max_queue_depth'] = max(
+        password_hashing_stats['max_queue_depth'],
+        password_hashing_stats['queue_depth']
+    )
+
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            password_executor,
+            function,
+            *args
+        )
+    finally:
+        password_hashing_stats['queue_depth'] -= 1
+
+
+def get_password_hashing_stats() -> dict:
+    return {
+        **password_hashing_stats,
+        'workers': settings.password_hashing.workers
+    }
+
+
+def hash_password_sync(password: str, rounds: int | None = None) -> bytes:
+    salt = bcrypt.gensalt(
+        rounds=rounds or settings.password_hashing.bcrypt_rounds
+    )
     return bcrypt.hashpw(password.encode(), salt)
 
 
-def validate_password(
+def validate_password_sync(
     password: str,
     hashed_password: bytes
 ) -> bool:
@@ -109,3 +200,29 @@ def validate_password(
         password=password.encode(),
         hashed_password=hashed_password
     )
+
+
+async def hash_password(
+    password: str
+) -> bytes:
+    return await run_password_job(hash_password_sync, password)
+
+
+async def validate_password(
+    password: str,
+    hashed_password: bytes
+) -> bool:
+    return await run_password_job(
+        validate_password_sync,
+        password,
+        hashed_password
+    )
+
+
+def password_needs_rehash(hashed_password: bytes) -> bool:
+    """
+    Checks whether the hash was made with another bcrypt cost
+    """
+    # Hash format: $2b$<rounds>$<salt and hash>
+    rounds = int(hashed_password.split(b'$')[2])
+    return rounds != settings.password_hashing.bcrypt_rounds
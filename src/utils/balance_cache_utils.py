@@ -0,0 +1,302 @@
+import time
+import asyncio
+import logging
+
+from dataclasses import dataclass
+from collections import defaultdict
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.config import settings
+from src.repositories import user_repository
+from src.utils.cache_utils import LRUCache
+from src.exceptions import user_exceptions, service_exceptions
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class TokenReservation:
+    user_id: int
+    amount: int
+    # Database hold, only when the balance cache is disabled
+    hold_id: int | None = None
+
+
+class BalanceCache:
+    """
+    Per-user balances of this process. Reads are served from memory for
+    `ttl` seconds, debits are applied locally and written behind in
+    batches. A crash loses about `max_pending` unwritten tokens per user
+    at most: while flushes fail, users with that many unwritten tokens
+    are refused. Balances changed by other processes are seen after `ttl`.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        max_pending: int,
+        flush_interval: float,
+        max_users: int
+    ):
+        self.ttl = ttl
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+
+        # Database balances as of the last read or write
+        self.balances = LRUCache(maxsize=max_users)
+        # Debited here and not yet written, never evicted
+        self.pending: defaultdict[int, int] = defaultdict(int)
+        # Debits being written right now
+        self.flushing: dict[int, int] = {}
+        # Held by requests in flight
+        self.reserved: defaultdict[int, int] = defaultdict(int)
+
+        # Number of the last change of each user's balance. A database
+        # read started before a change must not overwrite the newer value.
+        self.generation = 0
+        self.changed_at = LRUCache(maxsize=max_users)
+        # Unwritten debits only grow until a flush succeeds
+        self.flush_failing = False
+
+        self.flush_needed = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+        self.flushes = 0
+        self.failed_flushes = 0
+
+    async def get_balance(self, user_id: int) -> int:
+        balance = self.balances.get(user_id)
+
+        while balance is None:
+            read_at = self.generation
+            balance = await user_repository.get_user_tokens_count(user_id)
+
+            if self.changed_at.get(user_id, 0) > read_at:
+                # Flushed or invalidated during the read, the value read
+                # may predate the flush. Take the newer one or read again.
+                balance = self.balances.get(user_id)
+            else:
+                self.set_balance(user_id, balance)
+
+        return (
+            balance -
+            self.pending.get(user_id, 0) -
+            self.flushing.get(user_id, 0) -
+            self.reserved.get(user_id, 0)
+        )
+
+    def set_balance(self, user_id: int, balance: int) -> None:
+        self.balances.set(
+            user_id,
+            balance,
+            expires_at=time.time() + self.ttl
+        )
+        self.mark_changed(user_id)
+
+    def invalidate(self, user_id: int) -> None:
+        """Called when the balance was changed bypassing the cache"""
+        self.balances.delete(user_id)
+        self.mark_changed(user_id)
+
+    def mark_changed(self, user_id: int) -> None:
+        self.generation += 1
+        self.changed_at.set(user_id, self.generation)
+
+    def check_unwritten(self, user_id: int) -> None:
+        if not self.flush_failing:
+            return
+
+        unwritten = (
+            self.pending.get(user_id, 0) +
+            self.reserved.get(user_id, 0)
+        )
+        if unwritten >= self.max_pending:
+            raise service_exceptions.ServiceBusyError()
+
+    async def reserve(self, user_id: int, amount: int) -> None:
+        self.check_unwritten(user_id)
+
+        if await self.get_balance(user_id) < amount:
+            raise user_exceptions.UserTokensNotEnoughError()
+
+        self.reserved[user_id] += amount
+
+    def settle(self, user_id: int, amount: int, tokens_count: int) -> None:
+        self.reserved[user_id] -= amount
+        if not self.reserved[user_id]:
+            del self.reserved[user_id]
+
+        self.add_debit(user_id, tokens_count)
+
+    async def debit(
+        self,
+        user_id: int,
+        amount: int,
+        min_tokens_count: int
+    ) -> None:
+        self.check_unwritten(user_id)
+
+        if await self.get_balance(user_id) < min_tokens_count:
+            raise user_exceptions.UserTokensNotEnoughError()
+
+        self.add_debit(user_id, amount)
+
+    def add_debit(self, user_id: int, amount: int) -> None:
+        if not amount:
+            return
+
+        self.pending[user_id] += amount
+        if self.pending[user_id] >= self.max_pending:
+            self.flush_needed.set()
+
+    async def flush(self) -> None:
+        if not self.pending or self.flushing:
+            return
+
+        self.flushing = dict(self.pending)
+        self.pending.clear()
+
+        try:
+            # Sorted, so concurrent flushes lock rows in the same order
+            balances = await user_repository.apply_user_token_debits(
+                sorted(self.flushing.items())
+            )
+        except BaseException:
+            for user_id, amount in self.flushing.items():
+                self.pending[user_id] += amount
+            self.flushing = {}
+            self.flush_failing = True
+            raise
+
+        self.flushing = {}
+        self.flush_failing = False
+        self.flushes += 1
+
+        for user_id, balance in balances.items():
+            self.set_balance(user_id, balance)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self.flush_needed.wait(),
+                    timeout=self.flush_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+
+            self.flush_needed.clear()
+
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception('Balance cache flush failed')
+                self.failed_flushes += 1
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+        await self.flush()
+
+    def get_stats(self) -> dict:
+        return {
+            'users': len(self.balances),
+            'pending_users': len(self.pending),
+            'pending_tokens': sum(self.pending.values()),
+            'reserved_tokens': sum(self.reserved.values()),
+            'flushes': self.flushes,
+            'failed_flushes': self.failed_flushes
+        }
+
+
+balance_cache = BalanceCache(
+    ttl=settings.balance_cache.ttl_seconds,
+    max_pending=settings.balance_cache.max_pending_tokens,
+    flush_interval=settings.balance_cache.flush_interval_seconds,
+    max_users=settings.balance_cache.max_users
+)
+
+
+# The request's session is only used when the balance cache is disabled,
+# cache misses are read in a connection of their own
+async def get_tokens_count(
+    user_id: int,
+    session: AsyncSession | None = None
+) -> int:
+    if not settings.balance_cache.enabled:
+        return await user_repository.get_user_tokens_count(user_id, session)
+
+    return await balance_cache.get_balance(user_id)
+
+
+async def reserve_tokens(
+    user_id: int,
+    amount: int,
+    session: AsyncSession | None = None
+) -> TokenReservation:
+    if not settings.balance_cache.enabled:
+        return TokenReservation(
+            user_id=user_id,
+            amount=amount,
+            hold_id=await user_repository.reserve_user_tokens(
+                user_id,
+                amount,
+                session
+            )
+        )
+
+    await balance_cache.reserve(user_id, amount)
+    return TokenReservation(user_id=user_id, amount=amount)
+
+
+async def settle_tokens(
+    reservation: TokenReservation,
+    tokens_count: int,
+    session: AsyncSession | None = None
+) -> None:
+    if reservation.hold_id is not None:
+        await user_repository.settle_user_tokens(
+            reservation.hold_id,
+            tokens_count,
+            session
+        )
+        return
+
+    balance_cache.settle(
+        reservation.user_id,
+        reservation.amount,
+        tokens_count
+    )
+
+
+async def debit_tokens(
+    user_id: int,
+    amount: int,
+    min_tokens_count: int,
+    session: AsyncSession | None = None
+) -> None:
+    if not settings.balance_cache.enabled:
+        await user_repository.debit_user_tokens(
+            user_id,
+            amount,
+            min_tokens_count,
+            session
+        )
+        return
+
+    await balance_cache.debit(user_id, amount, min_tokens_count)
+
+
+def invalidate(user_id: int) -> None:
+    balance_cache.invalidate(user_id)
+
+
+def get_balance_cache_stats() -> dict:
+    return balance_cache.get_stats()
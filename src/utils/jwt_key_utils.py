@@ -0,0 +1,127 @@
+from pathlib import Path
+from functools import cache
+from dataclasses import dataclass
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa, ec, ed25519
+from cryptography.hazmat.primitives.asymmetric.types import (
+    PrivateKeyTypes,
+    PublicKeyTypes
+)
+
+from src.core.config import settings
+
+
+DEFAULT_KID = 'default'
+
+EC_CURVE_ALGORITHMS = {
+    'secp256r1': 'ES256',
+    'secp384r1': 'ES384',
+    'secp521r1': 'ES512'
+}
+
+
+@dataclass(frozen=True)
+class JWTKey:
+    kid: str
+    algorithm: str
+    public_key: PublicKeyTypes
+    private_key: PrivateKeyTypes | None = None
+
+
+def get_algorithm(public_key: PublicKeyTypes) -> str:
+    if isinstance(public_key, rsa.RSAPublicKey):
+        return 'RS256'
+    if isinstance(public_key, ed25519.Ed25519PublicKey):
+        return 'EdDSA'
+    if isinstance(public_key, ec.EllipticCurvePublicKey):
+        return EC_CURVE_ALGORITHMS[public_key.curve.name]
+
+    raise ValueError(f'Unsupported JWT key type: {type(public_key)}')
+
+
+def load_key(
+    kid: str,
+    private_key_path: Path,
+    public_key_path: Path
+) -> JWTKey:
+    """
+    Parses PEM files once, PyJWT uses key objects as is
+    """
+    public_key = serialization.load_pem_public_key(
+        public_key_path.read_bytes()
+    )
+
+    private_key = None
+    if private_key_path.exists():
+        private_key = serialization.load_pem_private_key(
+            private_key_path.read_bytes(),
+            password=None
+        )
+
+    return JWTKey(
+        kid=kid,
+        algorithm=get_algorithm(public_key),
+        public_key=public_key,
+        private_key=private_key
+    )
+
+
+def write_key_pair(private_key_path: Path, public_key_path: Path) -> None:
+    """
+    Writes a throwaway RSA key pair for tests and benchmarks,
+    deployments generate their own keys with openssl
+    """
+    private_key = rsa.generate_private_key(
+        public_exponent=65537,
+        key_size=2048
+    )
+
+    private_key_path.write_bytes(private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    ))
+    public_key_path.write_bytes(private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    ))
+
+
+@cache
+def get_keys() -> dict[str, JWTKey]:
+    keys = {}
+    keys_dir = settings.auth_jwt.keys_dir
+
+    if settings.auth_jwt.public_key_path.exists():
+        keys[DEFAULT_KID] = load_key(
+            kid=DEFAULT_KID,
+            private_key_path=settings.auth_jwt.private_key_path,
+            public_key_path=settings.auth_jwt.public_key_path
+        )
+
+    for public_key_path in sorted(keys_dir.glob('*.public.pem')):
+        kid = public_key_path.name.removesuffix('.public.pem')
+        keys[kid] = load_key(
+            kid=kid,
+            private_key_path=keys_dir / f'{kid}.private.pem',
+            public_key_path=public_key_path
+        )
+
+    return keys
+
+
+def get_signing_key() -> JWTKey:
+    key = get_keys().get(settings.auth_jwt.signing_kid)
+
+    if key is None or key.private_key is None:
+        raise RuntimeError(
+            f'No private key for kid "{settings.auth_jwt.signing_kid}" '
+            f'in {settings.auth_jwt.keys_dir}'
+        )
+
+    return key
+
+
+def get_verification_key(kid: str | None) -> JWTKey | None:
+    # Tokens issued before key rotation have no kid
+    return get_keys().get(kid or DEFAULT_KID)
@@ -0,0 +1,255 @@
+import time
+
+from bisect import bisect_left
+from functools import wraps
+from typing import Awaitable, Callable, TypeVar
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+T = TypeVar('T')
+
+# Seconds, from a cache hit to a long LLM answer
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1, 2.5, 5, 10, 30, 60
+)
+
+
+class Counter:
+    """Counter with positional label values, rendered in text format"""
+
+    def __init__(self, name: str, description: str, labels: tuple = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values: dict[tuple, float] = {}
+        metrics.append(self)
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        self.values[label_values] = (
+            self.values.get(label_values, 0) + amount
+        )
+
+    def render(self) -> list[str]:
+        lines = [
+            f'# HELP {self.name} {self.description}',
+            f'# TYPE {self.name} counter'
+        ]
+        for label_values, value in self.values.items():
+            lines.append(
+                f'{self.name}{format_labels(self.labels, label_values)} '
+                f'{value}'
+            )
+        return lines
+
+
+class Histogram:
+    """
+    Histogram with fixed buckets. An observation is one bisect and
+    two additions, cheap enough to keep on in production.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: tuple = (),
+        buckets: tuple = LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per bucket counts..., +Inf count, sum]
+        self.series: dict[tuple, list[float]] = {}
+        metrics.append(self)
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series = self.series.get(label_values)
+
+        if series is None:
+            series = self.series[label_values] = (
+                [0] * (len(self.buckets) + 2)
+            )
+
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def time(self, *label_values: str) -> 'Timer':
+        return Timer(self, label_values)
+
+    def render(self) -> list[str]:
+        lines = [
+            f'# HELP {self.name} {self.description}',
+            f'# TYPE {self.name} histogram'
+        ]
+        for label_values, series in self.series.items():
+            cumulative = 0
+
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                labels = format_labels(
+                    self.labels + ('le',),
+                    label_values + (str(bound),)
+                )
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+
+            labels = format_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {series[-1]}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Timer:
+    __slots__ = ('histogram', 'label_values', 'start_time')
+
+    def __init__(self, histogram: Histogram, label_values: tuple):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self) -> None:
+        self.start_time = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(
+            time.perf_counter() - self.start_time,
+            *self.label_values
+        )
+
+
+metrics: list[Counter | Histogram] = []
+
+
+def format_labels(labels: tuple, label_values: tuple) -> str:
+    if not labels:
+        return ''
+
+    pairs = ','.join(
+        f'{label}="{value}"' for label, value in zip(labels, label_values)
+    )
+    return '{' + pairs + '}'
+
+
+def format_stats(prefix: str, stats: dict) -> list[str]:
+    """Renders numeric values of a get_*_stats() dict as gauges"""
+    lines = []
+
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            lines += format_stats(f'{prefix}_{key}', value)
+        elif isinstance(value, (int, float)):
+            name = ''.join(
+                char if char.isalnum() else '_'
+                for char in f'{prefix}_{key}'
+            )
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {float(value)}')
+
+    return lines
+
+
+def render_metrics(stats: dict[str, dict] | None = None) -> str:
+    lines = []
+
+    for metric in metrics:
+        lines += metric.render()
+    for prefix, values in (stats or {}).items():
+        lines += format_stats(prefix, values)
+
+    return '\n'.join(lines) + '\n'
+
+
+def timed(
+    histogram: Histogram
+) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """Observes duration of every call of an async function by its name"""
+    def decorator(
+        function: Callable[..., Awaitable[T]]
+    ) -> Callable[..., Awaitable[T]]:
+        name = function.__name__
+
+        @wraps(function)
+        async def wrapper(*args, **kwargs) -> T:
+            start_time = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start_time, name)
+
+        return wrapper
+
+    return decorator
+
+
+request_duration = Histogram(
+    'http_request_duration_seconds',
+    'HTTP request latency by route',
+    labels=('method', 'route', 'status')
+)
+jwt_decode_duration = Histogram(
+    'jwt_decode_duration_seconds',
+    'JWT signature verification and decoding'
+)
+user_repository_duration = Histogram(
+    'user_repository_duration_seconds',
+    'User repository calls',
+    labels=('operation',)
+)
+ai_request_duration = Histogram(
+    'ai_request_duration_seconds',
+    'Upstream AI completion calls',
+    labels=('model', 'backend')
+)
+tokens_count_duration = Histogram(
+    'tokens_count_duration_seconds',
+    'Counting tokens of an AI response',
+    labels=('source',)
+)
+tokens_debited = Counter(
+    'tokens_debited_total',
+    'Tokens debited from users',
+    labels=('model',)
+)
+errors = Counter(
+    'errors_total',
+    'Errors returned to clients by class',
+    labels=('error',)
+)
+
+
+class MetricsMiddleware:
+    """Observes latency of every HTTP request by its route template"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(
+        self,
+        scope: Scope,
+        receive: Receive,
+        send: Send
+    ) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The route is set on the scope once the router matches it
+            route = scope.get('route')
+            request_duration.observe(
+                time.perf_counter() - start_time,
+                scope['method'],
+                route.path if route else 'unmatched',
+                str(status_code)
+            )
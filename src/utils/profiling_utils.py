@@ -0,0 +1,131 @@
+import re
+import hmac
+import time
+import anyio
+import asyncio
+import hashlib
+
+from pyinstrument import Profiler
+from pyinstrument.renderers import HTMLRenderer
+from pyinstrument.session import Session
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.core.config import settings
+from src.schemas import profiling_schema
+
+
+PROFILE_HEADER = b'x-profile'
+
+profiling_state = profiling_schema.ProfilingState(
+    enabled=settings.profiling.enabled
+)
+
+
+def get_signature(expires: int) -> str:
+    return hmac.new(
+        settings.profiling.secret.encode(),
+        str(expires).encode(),
+        hashlib.sha256
+    ).hexdigest()
+
+
+def sign_profile_header(expires_in: int = 600) -> str:
+    """X-Profile header value valid for `expires_in` seconds"""
+    expires = int(time.time()) + expires_in
+    return f'{expires}.{get_signature(expires)}'
+
+
+def verify_profile_header(value: str) -> bool:
+    if not settings.profiling.secret:
+        return False
+
+    expires, _, signature = value.partition('.')
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+
+    return hmac.compare_digest(signature, get_signature(int(expires)))
+
+
+def should_profile(scope: Scope) -> bool:
+    state = profiling_state
+
+    if state.enabled and scope['path'].startswith(state.path_prefix):
+        if state.requests is not None:
+            state.requests -= 1
+            state.enabled = state.requests > 0
+        return True
+
+    for name, value in scope['headers']:
+        if name == PROFILE_HEADER:
+            return verify_profile_header(value.decode('latin-1'))
+
+    return False
+
+
+def save_profile(profile_id: str, session: Session) -> None:
+    """
+    Renders the profile and keeps the last max_profiles profiles,
+    the oldest are deleted. Rendering is slow, run it in a thread.
+    """
+    profiles_dir = settings.profiling.dir
+    profiles_dir.mkdir(parents=True, exist_ok=True)
+
+    (profiles_dir / f'{profile_id}.html').write_text(
+        HTMLRenderer().render(session)
+    )
+
+    profiles = sorted(profiles_dir.glob('*.html'))
+    for path in profiles[:-settings.profiling.max_profiles]:
+        path.unlink(missing_ok=True)
+
+
+class ProfilingMiddleware:
+    """
+    Samples the call stack of chosen requests. Awaited time (DB, upstream,
+    bcrypt and big tokenizations in threads) shows up as `[await]` nodes
+    next to the CPU time of the event loop thread.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(
+        self,
+        scope: Scope,
+        receive: Receive,
+        send: Send
+    ) -> None:
+        if scope['type'] != 'http' or not should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = '{}-{}-{}'.format(
+            time.time_ns(),
+            scope['method'],
+            re.sub(r'[^\w-]+', '_', scope['path']).strip('_')
+        )
+
+        async def send_with_profile_id(message: Message) -> None:
+            if message['type'] == 'http.response.start':
+                headers = MutableHeaders(scope=message)
+                headers.append('X-Profile-Id', profile_id)
+            await send(message)
+
+        profiler = Profiler(
+            interval=settings.profiling.interval,
+            async_mode='enabled'
+        )
+        profiler.start()
+
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            session = profiler.stop()
+
+            with anyio.CancelScope(shield=True):
+                await asyncio.to_thread(save_profile, profile_id, session)
+
+
+if __name__ == '__main__':
+    print(f'X-Profile: {sign_profile_header()}')
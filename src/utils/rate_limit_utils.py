@@ -0,0 +1,229 @@
+import math
+import time
+
+from abc import ABC, abstractmethod
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.core.config import settings, RateLimitRule
+from src.utils import auth_utils, metrics_utils
+from src.utils.cache_utils import LRUCache
+from src.exceptions import service_exceptions
+
+
+# Checked in order, the first matching method and path prefix wins,
+# None matches any method
+ROUTE_GROUPS = [
+    # Polling an essay job is a cheap read, not an upstream call
+    ('GET', '/ai/compose/essay/jobs/', 'users_me'),
+    (None, '/ai/ask/', 'ai'),
+    (None, '/ai/compose/', 'ai'),
+    (None, '/users/me/', 'users_me'),
+    (None, '/users/', 'auth')
+]
+
+rate_limit_stats = {
+    'rejected': 0
+}
+
+
+class RateLimitBackend(ABC):
+    """
+    Storage of token buckets. A shared backend (e.g. Redis) must refill
+    and take tokens atomically, so several app instances share limits.
+    """
+
+    @abstractmethod
+    async def take(
+        self,
+        key: str,
+        rule: RateLimitRule,
+        cost: int = 1
+    ) -> float:
+        """
+        Takes `cost` tokens, returns seconds to wait if there are too few.
+        A cost over the burst is taken from a full bucket, the bucket goes
+        into debt that is repaid at the rate.
+        """
+
+    def get_stats(self) -> dict:
+        return {}
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Buckets of this process only, limits are per app instance"""
+
+    def __init__(self, max_keys: int):
+        # key -> [tokens, updated_at]
+        self.buckets = LRUCache(maxsize=max_keys)
+
+    async def take(
+        self,
+        key: str,
+        rule: RateLimitRule,
+        cost: int = 1
+    ) -> float:
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+
+        if bucket is None:
+            bucket = [rule.burst, now]
+            self.buckets.set(key, bucket)
+        else:
+            bucket[0] = min(
+                rule.burst,
+                bucket[0] + (now - bucket[1]) * rule.rate
+            )
+            bucket[1] = now
+
+        needed = min(cost, rule.burst)
+        if bucket[0] >= needed:
+            bucket[0] -= cost
+            return 0
+
+        return (needed - bucket[0]) / rule.rate
+
+    def get_stats(self) -> dict:
+        return self.buckets.get_stats()
+
+
+def get_route_group(method: str, path: str) -> str:
+    path = path.removeprefix('/api')
+
+    for group_method, prefix, group in ROUTE_GROUPS:
+        if group_method in (None, method) and path.startswith(prefix):
+            return group
+
+    return 'default'
+
+
+def get_client_ip(scope: Scope, headers: Headers) -> str:
+    trusted_proxies = settings.rate_limit.trusted_proxies
+    forwarded_for = headers.get('x-forwarded-for')
+
+    if trusted_proxies and forwarded_for:
+        addresses = [
+            address.strip() for address in forwarded_for.split(',')
+        ]
+        # Fewer entries than proxies: the request skipped the outer ones
+        return addresses[-min(trusted_proxies, len(addresses))]
+
+    client = scope.get('client')
+    return client[0] if client else 'unknown'
+
+
+def get_user_id(headers: Headers) -> str | None:
+    """Only verified tokens count, a forged `sub` gets the IP limit"""
+    scheme, _, token = headers.get('authorization', '').partition(' ')
+
+    if scheme.lower() != 'bearer' or not token:
+        return None
+
+    try:
+        return str(auth_utils.verify_token(token).get('sub'))
+    except HTTPException:
+        return None
+
+
+class RateLimitMiddleware:
+    """
+    Token bucket limits by route group, per JWT `sub` for signed in users
+    and per client IP for the others. Rejects with 429 before the request
+    reaches any endpoint.
+    """
+
+    def __init__(self, app: ASGIApp, backend: RateLimitBackend):
+        self.app = app
+        self.backend = backend
+
+    async def __call__(
+        self,
+        scope: Scope,
+        receive: Receive,
+        send: Send
+    ) -> None:
+        if scope['type'] != 'http' or not settings.rate_limit.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        group = get_route_group(scope['method'], scope['path'])
+        rule = (
+            settings.rate_limit.groups.get(group) or
+            settings.rate_limit.groups.get('default')
+        )
+
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Users behind one address (a school, a NAT) don't share a bucket
+        user_id = get_user_id(headers)
+        if user_id is not None:
+            retry_after = await self.backend.take(
+                f'{group}:user:{user_id}',
+                rule
+            )
+        else:
+            retry_after = await self.backend.take(
+                f'{group}:ip:{get_client_ip(scope, headers)}',
+                RateLimitRule(
+                    rate=rule.rate * settings.rate_limit.ip_multiplier,
+                    burst=math.ceil(
+                        rule.burst * settings.rate_limit.ip_multiplier
+                    )
+                )
+            )
+
+        if retry_after:
+            rate_limit_stats['rejected'] += 1
+            metrics_utils.errors.inc('TooManyRequestsError')
+            error = service_exceptions.TooManyRequestsError(
+                retry_after=math.ceil(retry_after)
+            )
+            response = JSONResponse(
+                {'detail': error.detail},
+                status_code=error.status_code,
+                headers=error.headers
+            )
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
+
+
+rate_limit_backend = MemoryRateLimitBackend(
+    max_keys=settings.rate_limit.max_keys
+)
+
+
+async def take_extra(group: str, user_id: int, cost: int) -> None:
+    """
+    Charges the user for a request that costs more than the one token
+    the middleware took, e.g. a batch is charged per item
+    """
+    rule = settings.rate_limit.groups.get(group)
+
+    if not settings.rate_limit.enabled or rule is None or cost <= 0:
+        return
+
+    retry_after = await rate_limit_backend.take(
+        f'{group}:user:{user_id}',
+        rule,
+        cost
+    )
+
+    if retry_after:
+        rate_limit_stats['rejected'] += 1
+        raise service_exceptions.TooManyRequestsError(
+            retry_after=math.ceil(retry_after)
+        )
+
+
+def get_rate_limit_stats() -> dict:
+    return {
+        **rate_limit_stats,
+        'backend': rate_limit_backend.get_stats()
+    }
@@ -1,5 +1,11 @@
-from typing import Type, Dict, List
+import anyio
+import hashlib
+
+from typing import Awaitable, Callable, Type, Dict, List
 from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from starlette.types import Receive, Scope, Send
 
 
 def get_error_response_schema(description: str) -> dict:
@@ -50,3 +56,58 @@ def combine_error_responses(
         }
 
     return responses
+
+
+def get_sse_event(data: BaseModel, event: str | None = None) -> str:
+    """
+    Serializes a schema into a single server-sent event
+    """
+    lines = []
+
+    if event:
+        lines.append(f'event: {event}')
+    lines.append(f'data: {data.model_dump_json()}')
+
+    return '\n'.join(lines) + '\n\n'
+
+
+def get_etag(content: bytes) -> str:
+    return f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Checks an If-None-Match header, weak validators match too
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+
+    return etag in (
+        tag.strip().removeprefix('W/') for tag in if_none_match.split(',')
+    )
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    Runs `on_close` once the response is over. Starlette doesn't start
+    the body iterator at all if the client disconnects before it, so
+    its `finally` can't be relied on to release resources.
+    """
+
+    def __init__(
+        self,
+        content,
+        on_close: Callable[[], Awaitable[None]],
+        **kwargs
+    ):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            with anyio.CancelScope(shield=True):
+                await self.on_close()
@@ -0,0 +1,69 @@
+import asyncio
+
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller
+    starts the call, the others await its result. The call outlives
+    cancelled callers while others still await it.
+    """
+
+    def __init__(self):
+        self.calls: dict[Hashable, asyncio.Task] = {}
+        # Callers awaiting each call
+        self.waiters: dict[asyncio.Task, int] = {}
+        self.started_calls = 0
+        self.saved_calls = 0
+
+    async def run(
+        self,
+        key: Hashable,
+        function: Callable[[], Awaitable[T]]
+    ) -> T:
+        task = self.calls.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(function())
+            task.add_done_callback(
+                lambda done_task: self.forget(key, done_task)
+            )
+            self.calls[key] = task
+            self.started_calls += 1
+        else:
+            self.saved_calls += 1
+
+        self.waiters[task] = self.waiters.get(task, 0) + 1
+        try:
+            # A cancelled caller must not cancel the call for the others
+            return await asyncio.shield(task)
+        finally:
+            self.waiters[task] -= 1
+            if not self.waiters[task]:
+                del self.waiters[task]
+
+                if not task.done():
+                    # Every caller is gone, nobody needs the result. The
+                    # done callback runs later, callers coming before it
+                    # must start a call of their own
+                    self.forget(key, task)
+                    task.cancel()
+
+    def forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self.calls.get(key) is task:
+            del self.calls[key]
+
+        if task.done() and not task.cancelled():
+            # Marks the exception as retrieved if every caller is gone
+            task.exception()
+
+    def get_stats(self) -> dict:
+        return {
+            'started_calls': self.started_calls,
+            'saved_calls': self.saved_calls,
+            'in_flight': len(self.calls)
+        }
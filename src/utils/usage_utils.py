@@ -0,0 +1,131 @@
+import asyncio
+import logging
+
+from datetime import datetime, UTC
+
+from src.core.config import settings
+from src.enums.ai_models import Model
+from src.repositories import usage_repository
+
+
+logger = logging.getLogger(__name__)
+
+
+class UsageLedger:
+    """
+    Buffers usage events in memory and writes them in batches, when
+    batch_size events are buffered or every flush_interval seconds.
+    Recording never waits on the database.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        flush_interval: float,
+        max_buffered: int
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+
+        self.events: list[dict] = []
+        self.batch_ready = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+        self.flushed = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+
+    def record(self, event: dict) -> None:
+        if len(self.events) >= self.max_buffered:
+            # The database is down for long, memory is kept bounded
+            self.dropped += 1
+            return
+
+        self.events.append(event)
+        if len(self.events) >= self.batch_size:
+            self.batch_ready.set()
+
+    async def flush(self) -> None:
+        while self.events:
+            batch = self.events[:self.batch_size]
+            del self.events[:self.batch_size]
+
+            try:
+                await usage_repository.add_usage_events(batch)
+            except asyncio.CancelledError:
+                self.events[:0] = batch
+                raise
+            except Exception:
+                logger.exception('Usage events flush failed')
+                self.failed_flushes += 1
+                # Retried with the next flush
+                self.events[:0] = batch
+                return
+
+            self.flushed += len(batch)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self.batch_ready.wait(),
+                    timeout=self.flush_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+
+            self.batch_ready.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+        await self.flush()
+
+    def get_stats(self) -> dict:
+        return {
+            'buffered': len(self.events),
+            'flushed': self.flushed,
+            'dropped': self.dropped,
+            'failed_flushes': self.failed_flushes
+        }
+
+
+usage_ledger = UsageLedger(
+    batch_size=settings.usage_ledger.batch_size,
+    flush_interval=settings.usage_ledger.flush_interval_seconds,
+    max_buffered=settings.usage_ledger.max_buffered
+)
+
+
+def record_usage(
+    user_id: int,
+    model: Model,
+    endpoint: str,
+    completion_tokens: int,
+    prompt_tokens: int | None = None,
+    upstream_latency: float | None = None
+) -> None:
+    if not settings.usage_ledger.enabled:
+        return
+
+    usage_ledger.record({
+        'user_id': user_id,
+        'model': model.value,
+        'endpoint': endpoint,
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'upstream_latency': upstream_latency,
+        'created_at': datetime.now(UTC).replace(tzinfo=None)
+    })
+
+
+def get_usage_ledger_stats() -> dict:
+    return usage_ledger.get_stats()
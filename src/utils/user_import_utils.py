@@ -0,0 +1,145 @@
+"""
+Bulk user import for school onboarding. Reads a CSV file with
+`username`, `email` and `password` columns:
+    python -m src.utils.user_import_utils students.csv
+    python -m src.utils.user_import_utils students.csv --bcrypt-rounds 4
+
+bcrypt at the default cost hashes a few passwords per second per core,
+which bounds the import speed. Initial passwords may be hashed with
+a lower cost, they are re-hashed with BCRYPT_ROUNDS on the first login.
+"""
+import os
+import csv
+import time
+import asyncio
+import logging
+import argparse
+
+from pathlib import Path
+from itertools import islice
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import ValidationError
+
+from src.schemas import user_schema
+from src.database.database import engine
+from src.repositories import user_repository
+from src.utils import auth_utils
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class ImportResult:
+    imported: int = 0
+    # Username or email already taken
+    skipped: int = 0
+    invalid: int = 0
+
+
+def read_users(
+    lines: Iterable[str],
+    result: ImportResult
+) -> Iterator[user_schema.UserCreate]:
+    # Line 1 is the header
+    for line_number, row in enumerate(csv.DictReader(lines), start=2):
+        try:
+            yield user_schema.UserCreate.model_validate(row)
+        except ValidationError as error:
+            result.invalid += 1
+            logger.warning(
+                'Line %d skipped: %s',
+                line_number,
+                error.errors()[0]['msg']
+            )
+
+
+async def hash_users(
+    users: list[user_schema.UserCreate],
+    executor: ThreadPoolExecutor,
+    bcrypt_rounds: int | None = None
+) -> list[user_schema.UserToAddInDB]:
+    loop = asyncio.get_running_loop()
+
+    # bcrypt releases the GIL, the threads hash in parallel
+    hashed_passwords = await asyncio.gather(*[
+        loop.run_in_executor(
+            executor,
+            auth_utils.hash_password_sync,
+            user.password,
+            bcrypt_rounds
+        )
+        for user in users
+    ])
+
+    return [
+        user_schema.UserToAddInDB(
+            **user.model_dump(exclude={'password'}),
+            hashed_password=hashed_password
+        )
+        for user, hashed_password in zip(users, hashed_passwords)
+    ]
+
+
+async def import_users(
+    lines: Iterable[str],
+    batch_size: int = 5000,
+    bcrypt_rounds: int | None = None,
+    workers: int | None = None
+) -> ImportResult:
+    """
+    Hashes the passwords of each batch in a thread pool and writes the
+    batch with one COPY. Rows that fail validation are skipped.
+    """
+    result = ImportResult()
+    users = read_users(lines, result)
+
+    with ThreadPoolExecutor(workers or os.cpu_count()) as executor:
+        while batch := list(islice(users, batch_size)):
+            users_to_add = await hash_users(batch, executor, bcrypt_rounds)
+            imported = await user_repository.import_users(users_to_add)
+
+            result.imported += imported
+            result.skipped += len(batch) - imported
+
+    return result
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('path', type=Path)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument(
+        '--bcrypt-rounds',
+        type=int,
+        help='Cost of the initial hashes, BCRYPT_ROUNDS by default'
+    )
+    parser.add_argument('--workers', type=int, help='Hashing threads')
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+
+    # utf-8-sig also reads CSV files saved by Excel
+    with args.path.open(encoding='utf-8-sig', newline='') as file:
+        result = await import_users(
+            file,
+            batch_size=args.batch_size,
+            bcrypt_rounds=args.bcrypt_rounds,
+            workers=args.workers
+        )
+
+    await engine.dispose()
+
+    duration = time.perf_counter() - start_time
+    print(
+        f'{result.imported} imported, {result.skipped} already taken, '
+        f'{result.invalid} invalid in {duration:.1f} s '
+        f'({result.imported / duration:.0f} users/s)'
+    )
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
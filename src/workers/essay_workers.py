@@ -0,0 +1,136 @@
+import time
+import asyncio
+import logging
+
+from datetime import timedelta
+
+from src.schemas import ai_schema
+from src.core.config import settings
+from src.enums.ai_models import Model
+from src.repositories import essay_job_repository, user_repository
+from src.utils import balance_cache_utils, metrics_utils, usage_utils
+from src.utils.ai import ai_utils, essay_cache_utils
+
+
+logger = logging.getLogger(__name__)
+
+workers: list[asyncio.Task] = []
+last_cleanup_time = 0.0
+
+
+async def process_essay_job(job: ai_schema.EssayJob) -> None:
+    if job.attempts > settings.essay_jobs.max_attempts:
+        # Claimed again after its worker died on the last attempt
+        await user_repository.settle_user_tokens(job.hold_id, 0)
+        await essay_job_repository.fail_essay_job(
+            job.id,
+            error='Essay generation timed out'
+        )
+        return
+
+    cache_key = essay_cache_utils.get_cache_key(job.request)
+
+    try:
+        essay = await essay_cache_utils.get_cached_essay(cache_key)
+        if essay is None:
+            essay = await ai_utils.compose_essay(
+                job.request,
+                user_id=job.user_id
+            )
+            await essay_cache_utils.store_essay(
+                cache_key=cache_key,
+                text=essay.text,
+                tokens=essay.tokens
+            )
+    except Exception as error:
+        logger.exception('Essay job %s failed', job.id)
+        error_text = f'Essay generation failed: {type(error).__name__}'
+
+        if job.attempts < settings.essay_jobs.max_attempts:
+            await essay_job_repository.retry_essay_job(
+                job.id,
+                error=error_text,
+                delay=timedelta(
+                    seconds=settings.essay_jobs.retry_delay_seconds *
+                    job.attempts
+                )
+            )
+        else:
+            await user_repository.settle_user_tokens(job.hold_id, 0)
+            await essay_job_repository.fail_essay_job(job.id, error=error_text)
+        return
+
+    # Settling first keeps billing exactly-once if the worker dies
+    # before the job is marked as done: the repeated settle is a no-op
+    balance = await user_repository.settle_user_tokens(
+        job.hold_id,
+        essay.tokens
+    )
+    balance_cache_utils.invalidate(job.user_id)
+    if balance is not None:
+        metrics_utils.tokens_debited.inc(
+            Model.GPT_4O_MINI.value,
+            amount=essay.tokens
+        )
+        # Cached essays cost nothing upstream
+        generated = isinstance(essay, ai_schema.EssayCompletion)
+        usage_utils.record_usage(
+            user_id=job.user_id,
+            model=Model.GPT_4O_MINI,
+            endpoint='compose_essay_job',
+            completion_tokens=essay.tokens,
+            prompt_tokens=essay.prompt_tokens if generated else None,
+            upstream_latency=essay.latency if generated else None
+        )
+
+    await essay_job_repository.complete_essay_job(
+        job.id,
+        text=essay.text,
+        tokens=essay.tokens
+    )
+
+
+async def cleanup_essay_jobs() -> None:
+    global last_cleanup_time
+
+    result_ttl = timedelta(minutes=settings.essay_jobs.result_ttl_minutes)
+
+    # Once per minute is enough for a TTL measured in minutes
+    if time.monotonic() - last_cleanup_time < 60:
+        return
+
+    last_cleanup_time = time.monotonic()
+    await essay_job_repository.delete_finished_essay_jobs(
+        older_than=result_ttl
+    )
+
+
+async def run_essay_worker() -> None:
+    job_timeout = timedelta(minutes=settings.essay_jobs.job_timeout_minutes)
+
+    while True:
+        try:
+            job = await essay_job_repository.claim_essay_job(job_timeout)
+
+            if job is None:
+                await cleanup_essay_jobs()
+                await asyncio.sleep(settings.essay_jobs.poll_interval_seconds)
+                continue
+
+            await process_essay_job(job)
+        except Exception:
+            logger.exception('Essay worker iteration failed')
+            await asyncio.sleep(settings.essay_jobs.poll_interval_seconds)
+
+
+def start_essay_workers() -> None:
+    for _ in range(settings.essay_jobs.workers):
+        workers.append(asyncio.create_task(run_essay_worker()))
+
+
+async def stop_essay_workers() -> None:
+    for worker in workers:
+        worker.cancel()
+
+    await asyncio.gather(*workers, return_exceptions=True)
+    workers.clear()
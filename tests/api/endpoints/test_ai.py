@@ -1,9 +1,16 @@
+import json
+import asyncio
 import pytest
 
 from httpx import AsyncClient, ASGITransport
 from src.main import app
 from src.schemas import ai_schema
 from src.core.config import settings
+from src.api.endpoints import ai
+from src.enums.ai_models import Model
+from src.utils.balance_cache_utils import TokenReservation
+from src.repositories import user_repository
+from src.utils.ai import ai_utils
 
 
 @pytest.mark.asyncio(loop_scope='session')
@@ -82,3 +89,228 @@ async def test_compose_essay(access_token):
             }
         )
         assert response.status_code == 200
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_request_ai_stream(access_token):
+    async with AsyncClient(
+        base_url='http://test',
+        transport=ASGITransport(app=app)
+    ) as ac:
+        request_data = {
+            "text": "Hi",
+            "model": "gpt-4o-mini"
+        }
+        response = await ac.post(
+            '/ai/ask/stream/',
+            json=request_data,
+            headers={
+                "Authorization": f"Bearer {access_token}",
+                "Content-Type": "application/json"
+            }
+        )
+        assert response.status_code == 200
+        assert response.headers['content-type'].startswith(
+            'text/event-stream'
+        )
+        assert 'event: done' in response.text
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_stream_closes_upstream_on_disconnect(monkeypatch):
+    closed = False
+
+    async def deltas():
+        nonlocal closed
+        try:
+            for _ in range(10):
+                yield ai_schema.AICompletion(text='Hi')
+        finally:
+            closed = True
+
+    async def get_tokens_count(text, model, backend=None):
+        return 1
+
+    monkeypatch.setattr(ai_utils, 'get_tokens_count', get_tokens_count)
+
+    upstream = deltas()
+    stream = ai.AIStream(
+        request=ai_schema.AIRequest(text='Hi', model=Model.GPT_4O_MINI),
+        user_id=1,
+        reservation=TokenReservation(user_id=1, amount=0),
+        deltas=upstream
+    )
+    events = ai.stream_ai_response(stream, await anext(upstream))
+
+    # The client disconnects after the first event
+    await anext(events)
+    await events.aclose()
+    assert closed
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_stream_settles_on_disconnect_before_body(
+    monkeypatch,
+    access_token,
+    user_payload
+):
+    closed = False
+
+    async def ai_stream_request(request, model, user_id):
+        nonlocal closed
+        try:
+            for _ in range(10):
+                yield ai_schema.AICompletion(text='Hi')
+        finally:
+            closed = True
+
+    async def get_tokens_count(text, model, backend=None):
+        return 1
+
+    monkeypatch.setattr(ai_utils, 'ai_stream_request', ai_stream_request)
+    monkeypatch.setattr(ai_utils, 'get_tokens_count', get_tokens_count)
+
+    user_id = int(user_payload['sub'])
+    balance = await user_repository.get_user_tokens_count(user_id)
+
+    body = json.dumps({'text': 'Hi', 'model': 'gpt-4o-mini'}).encode()
+    messages = [{'type': 'http.request', 'body': body}]
+
+    async def receive():
+        # The client is gone right after sending the request
+        if messages:
+            return messages.pop()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        # The headers are never sent, the disconnect comes first
+        if message['type'] == 'http.response.start':
+            await asyncio.Event().wait()
+
+    await app(
+        {
+            'type': 'http',
+            'asgi': {'version': '3.0', 'spec_version': '2.3'},
+            'http_version': '1.1',
+            'method': 'POST',
+            'scheme': 'http',
+            'path': '/ai/ask/stream/',
+            'raw_path': b'/ai/ask/stream/',
+            'root_path': '',
+            'query_string': b'',
+            'headers': [
+                (b'host', b'test'),
+                (b'authorization', f'Bearer {access_token}'.encode()),
+                (b'content-type', b'application/json')
+            ],
+            'client': ('127.0.0.1', 50000),
+            'server': ('test', 80)
+        },
+        receive,
+        send
+    )
+
+    # The body never started, the reservation is released all the same
+    assert closed
+    assert await user_repository.get_user_tokens_count(user_id) == balance
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_request_ai_batch(access_token):
+    async with AsyncClient(
+        base_url='http://test',
+        transport=ASGITransport(app=app)
+    ) as ac:
+        request_data = {
+            "requests": [
+                {"text": "Hi", "model": "gpt-4o-mini"},
+                {"text": "Hello", "model": "gpt-4o-mini"}
+            ]
+        }
+        response = await ac.post(
+            '/ai/ask/batch/',
+            json=request_data,
+            headers={
+                "Authorization": f"Bearer {access_token}",
+                "Content-Type": "application/json"
+            }
+        )
+        assert response.status_code == 200
+        assert len(response.json()['results']) == 2
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_request_ai_batch_bills_finished_items(
+    access_token,
+    monkeypatch
+):
+    async def ai_request(request, model, user_id=None):
+        if request == 'Fail':
+            raise RuntimeError()
+        return ai_schema.AICompletion(text='Answer', completion_tokens=7)
+
+    monkeypatch.setattr(ai_utils, 'ai_request', ai_request)
+
+    async with AsyncClient(
+        base_url='http://test',
+        transport=ASGITransport(app=app)
+    ) as ac:
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = await ac.get('/users/me/tokens/', headers=headers)
+        tokens_count = response.json()['tokens_count']
+
+        response = await ac.post(
+            '/ai/ask/batch/',
+            json={
+                "requests": [
+                    {"text": "Hi", "model": "gpt-4o-mini"},
+                    {"text": "Fail", "model": "gpt-4o-mini"}
+                ]
+            },
+            headers=headers
+        )
+        assert response.status_code == 200
+        assert response.json()['tokens'] == 7
+        assert response.json()['results'] == [
+            {'text': 'Answer', 'tokens': 7, 'error': None},
+            {
+                'text': None,
+                'tokens': 0,
+                'error': 'AI request failed: RuntimeError'
+            }
+        ]
+
+        response = await ac.get('/users/me/tokens/', headers=headers)
+        assert response.json()['tokens_count'] == tokens_count - 7
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_submit_and_get_essay_job(access_token):
+    async with AsyncClient(
+        base_url='http://test',
+        transport=ASGITransport(app=app)
+    ) as ac:
+        headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json"
+        }
+        request_data = {
+            "theme": "Трагизм Мцыри",
+            "author": "Н. Ю. Лермонтов",
+            "word_count": 1,
+            "additional_info": "Трагический герой"
+        }
+        response = await ac.post(
+            '/ai/compose/essay/jobs/',
+            json=request_data,
+            headers=headers
+        )
+        assert response.status_code == 202
+        job_id = response.json()['id']
+
+        response = await ac.get(
+            f'/ai/compose/essay/jobs/{job_id}/',
+            headers=headers
+        )
+        assert response.status_code == 200
+        assert response.json()['id'] == job_id
@@ -0,0 +1,38 @@
+import pytest
+
+from httpx import AsyncClient, ASGITransport
+from src.main import app
+from src.core.config import settings
+from src.utils.ai import router_utils
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_get_metrics(monkeypatch):
+    monkeypatch.setattr(settings.metrics, 'token', 'metrics-token')
+
+    async with AsyncClient(
+        base_url='http://test',
+        transport=ASGITransport(app=app)
+    ) as ac:
+        await ac.get('/ai/minimum-tokens-for-ai/')
+        await ac.get('/users/me/tokens/')
+        router_utils.get_router()
+
+        response = await ac.get('/metrics')
+        assert response.status_code == 401
+
+        response = await ac.get(
+            '/metrics',
+            headers={'Authorization': 'Bearer metrics-token'}
+        )
+
+        assert response.status_code == 200
+        assert (
+            'http_request_duration_seconds_count{method="GET",'
+            'route="/ai/minimum-tokens-for-ai/",status="200"}'
+        ) in response.text
+        assert 'errors_total{error="UserNotAuthenticatedError"}' in (
+            response.text
+        )
+        assert 'db_pool_checkouts' in response.text
+        assert 'ai_backends_' in response.text
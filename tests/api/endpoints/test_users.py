@@ -0,0 +1,88 @@
+import pytest
+import asyncio
+
+from httpx import AsyncClient, ASGITransport
+from src.main import app
+from src.core.config import settings
+from src.database.database import engine
+from src.schemas import user_schema
+from src.repositories import user_repository
+from src.exceptions import user_exceptions
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_get_user_status(access_token):
+    async with AsyncClient(
+        base_url='http://test',
+        transport=ASGITransport(app=app)
+    ) as ac:
+        headers = {'Authorization': f'Bearer {access_token}'}
+        response = await ac.get('/users/me/', headers=headers)
+
+        assert response.status_code == 200
+        tokens_count = response.json()['tokens_count']
+        assert response.json() == {
+            'tokens_count': tokens_count,
+            'can_compose_essay': (
+                tokens_count >= settings.ai.min_tokens_for_essay
+            ),
+            'can_request_chatgpt': (
+                tokens_count >= settings.ai.min_tokens_for_ai
+            ),
+            'min_tokens_for_essay': settings.ai.min_tokens_for_essay,
+            'min_tokens_for_ai': settings.ai.min_tokens_for_ai
+        }
+
+        etag = response.headers['ETag']
+        response = await ac.get(
+            '/users/me/',
+            headers={**headers, 'If-None-Match': etag}
+        )
+
+        assert response.status_code == 304
+        assert response.headers['ETag'] == etag
+        assert response.content == b''
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_login_unknown_user(registered_client):
+    async with AsyncClient(
+        base_url='http://test',
+        transport=ASGITransport(app=app)
+    ) as ac:
+        response = await ac.post(
+            '/users/login/',
+            json={
+                'username': None,
+                'email': 'nobody@example.ru',
+                'password': '12345'
+            }
+        )
+
+        assert response.status_code == 401
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_register_concurrently():
+    async def hold_connection():
+        async with engine.connect():
+            await asyncio.sleep(0.1)
+
+    # Connected in advance, so the sign-ups really run at the same time
+    await asyncio.gather(*[hold_connection() for _ in range(5)])
+
+    user_to_add = user_schema.UserToAddInDB(
+        username='Twins',
+        email='twins@example.ru',
+        hashed_password=b'hash'
+    )
+    results = await asyncio.gather(
+        *[user_repository.create_user(user_to_add) for _ in range(5)],
+        return_exceptions=True
+    )
+
+    errors = [
+        result for result in results
+        if isinstance(result, user_exceptions.UserAlreadyExistsError)
+    ]
+    assert len(errors) == 4
@@ -1,3 +1,5 @@
+import pytest
+
 from pytest_asyncio import fixture
 from httpx import AsyncClient, ASGITransport
 from typing import AsyncGenerator
@@ -6,9 +8,35 @@ from src.core.config import settings
 from src.database.database import engine
 from src.database.models import Base
 from src.schemas import user_schema, token_schema
+from src.utils import jwt_key_utils
 from src.utils.auth_utils import decode_jwt
 
 
+@pytest.fixture(scope='session', autouse=True)
+def jwt_keys(tmp_path_factory):
+    keys_dir = tmp_path_factory.mktemp('certs')
+    jwt_key_utils.write_key_pair(
+        keys_dir / 'private.pem',
+        keys_dir / 'public.pem'
+    )
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(settings.auth_jwt, 'keys_dir', keys_dir)
+        monkeypatch.setattr(
+            settings.auth_jwt,
+            'private_key_path',
+            keys_dir / 'private.pem'
+        )
+        monkeypatch.setattr(
+            settings.auth_jwt,
+            'public_key_path',
+            keys_dir / 'public.pem'
+        )
+        jwt_key_utils.get_keys.cache_clear()
+        yield
+    jwt_key_utils.get_keys.cache_clear()
+
+
 @fixture(loop_scope='session', autouse=True)
 async def setup_db():
     assert settings.database_settings.MODE == 'TEST'
@@ -0,0 +1,93 @@
+import pytest
+
+from datetime import timedelta
+
+from src.schemas import ai_schema, user_schema
+from src.repositories import essay_job_repository, user_repository
+from src.database.database import get_session
+from src.exceptions import user_exceptions
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_session_commits_once():
+    await user_repository.create_user(user_schema.UserToAddInDB(
+        username='UnitOfWork',
+        email='unit-of-work@example.ru',
+        hashed_password=b'hash'
+    ))
+    user = await user_repository.get_user_credentials(username='UnitOfWork')
+    balance = await user_repository.get_user_tokens_count(user.id)
+
+    # The endpoint raises, nothing of the request is written
+    sessions = get_session()
+    session = await anext(sessions)
+    await user_repository.reserve_user_tokens(user.id, 10, session=session)
+    assert await user_repository.get_user_tokens_count(
+        user.id,
+        session=session
+    ) == balance - 10
+
+    with pytest.raises(RuntimeError):
+        await sessions.athrow(RuntimeError())
+    assert await user_repository.get_user_tokens_count(user.id) == balance
+
+    # The endpoint returns, both calls are committed together
+    sessions = get_session()
+    session = await anext(sessions)
+    hold_id = await user_repository.reserve_user_tokens(
+        user.id,
+        10,
+        session=session
+    )
+    await user_repository.settle_user_tokens(hold_id, 3, session=session)
+
+    with pytest.raises(StopAsyncIteration):
+        await anext(sessions)
+    assert await user_repository.get_user_tokens_count(user.id) == balance - 3
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_token_holds():
+    await user_repository.create_user(user_schema.UserToAddInDB(
+        username='TokenHolds',
+        email='token-holds@example.ru',
+        hashed_password=b'hash'
+    ))
+    user = await user_repository.get_user_credentials(username='TokenHolds')
+    balance = await user_repository.get_user_tokens_count(user.id)
+
+    with pytest.raises(user_exceptions.UserTokensNotEnoughError):
+        await user_repository.reserve_user_tokens(user.id, balance + 1)
+    assert await user_repository.get_user_tokens_count(user.id) == balance
+
+    # The hold is refunded and the real spending debited once
+    hold_id = await user_repository.reserve_user_tokens(user.id, 10)
+    assert await user_repository.settle_user_tokens(
+        hold_id,
+        3
+    ) == balance - 3
+    assert await user_repository.settle_user_tokens(hold_id, 3) is None
+    assert await user_repository.get_user_tokens_count(user.id) == balance - 3
+
+    # Unsettled holds are refunded, holds of queued essay jobs are kept
+    await user_repository.reserve_user_tokens(user.id, 10)
+    job_hold_id = await user_repository.reserve_user_tokens(user.id, 20)
+    await essay_job_repository.create_essay_job(
+        user.id,
+        job_hold_id,
+        ai_schema.ComposeEssayRequest(
+            theme='Трагизм Мцыри',
+            author='Н. Ю. Лермонтов',
+            word_count=250,
+            additional_info=None
+        )
+    )
+
+    await user_repository.release_stale_token_holds(timedelta(0))
+    assert await user_repository.get_user_tokens_count(
+        user.id
+    ) == balance - 3 - 20
+    assert await user_repository.settle_user_tokens(
+        job_hold_id,
+        20
+    ) == balance - 3 - 20
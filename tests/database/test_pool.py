@@ -0,0 +1,44 @@
+import pytest
+
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.core.config import settings
+from src.database.database import get_pool_stats
+from src.database.pool import InstrumentedAsyncQueuePool
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_pool_stats():
+    engine = create_async_engine(
+        settings.database_settings.url,
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_size=1,
+        max_overflow=1,
+        pool_timeout=0.1
+    )
+
+    try:
+        async with engine.connect() as connection:
+            await connection.execute(text('SELECT 1'))
+            stats = engine.pool.get_stats()
+            assert (stats['checkouts'], stats['checked_out']) == (1, 1)
+
+            # The second connection overflows, the third times out
+            async with engine.connect() as overflow_connection:
+                await overflow_connection.execute(text('SELECT 1'))
+                assert engine.pool.get_stats()['overflow'] == 1
+
+                with pytest.raises(exc.TimeoutError):
+                    await engine.connect()
+
+        stats = engine.pool.get_stats()
+        assert stats['checkouts'] == 2
+        assert stats['checked_out'] == 0
+        assert stats['overflow_events'] == 1
+        assert stats['timeouts'] == 1
+        assert stats['wait_seconds_max'] >= 0.1
+    finally:
+        await engine.dispose()
+
+    assert set(stats) == set(get_pool_stats())
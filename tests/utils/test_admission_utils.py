@@ -0,0 +1,74 @@
+import asyncio
+import pytest
+
+from src.exceptions import service_exceptions
+from src.utils.ai.admission_utils import AdmissionController
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_admission_shares_slots_fairly_between_users():
+    admission = AdmissionController(max_concurrency=1, max_queue=10, timeout=5)
+    order = []
+
+    async def call(user_id: int):
+        async with admission.admit(user_id):
+            order.append(user_id)
+            await asyncio.sleep(0.01)
+
+    # The first user queues many calls before the second one arrives
+    tasks = [asyncio.create_task(call(1)) for _ in range(4)]
+    await asyncio.sleep(0)
+    tasks += [asyncio.create_task(call(2)) for _ in range(2)]
+    await asyncio.gather(*tasks)
+
+    assert order == [1, 1, 2, 1, 2, 1]
+    assert admission.get_stats()['active'] == 0
+    assert admission.get_stats()['waiting'] == 0
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_admission_rejects_when_queue_is_full():
+    admission = AdmissionController(max_concurrency=1, max_queue=1, timeout=5)
+
+    await admission.acquire(1)
+    waiter = asyncio.create_task(admission.acquire(2))
+    await asyncio.sleep(0)
+
+    with pytest.raises(service_exceptions.ServiceBusyError) as error:
+        await admission.acquire(3)
+
+    assert error.value.headers['Retry-After'] == '2'
+
+    admission.release()
+    await waiter
+    admission.release()
+
+    assert admission.get_stats()['rejected_queue_full'] == 1
+    assert admission.get_stats()['active'] == 0
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_admission_rejects_requests_that_miss_deadline():
+    admission = AdmissionController(
+        max_concurrency=1,
+        max_queue=10,
+        timeout=0.05
+    )
+    admission.service_time = 0.01
+
+    await admission.acquire(1)
+
+    # Expected to start in time, but the slot is never released
+    with pytest.raises(service_exceptions.ServiceBusyError):
+        await admission.acquire(2)
+
+    # Known to be too slow, rejected without waiting
+    admission.service_time = 1
+    with pytest.raises(service_exceptions.ServiceBusyError):
+        await admission.acquire(3)
+
+    admission.release()
+
+    assert admission.get_stats()['rejected_deadline'] == 2
+    assert admission.get_stats()['waiting'] == 0
+    assert admission.get_stats()['active'] == 0
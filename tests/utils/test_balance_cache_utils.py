@@ -0,0 +1,172 @@
+import pytest
+import asyncio
+
+from src.schemas import user_schema
+from src.repositories import user_repository
+from src.exceptions import user_exceptions, service_exceptions
+from src.utils.balance_cache_utils import BalanceCache
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_balance_cache_writes_debits_behind():
+    await user_repository.create_user(user_schema.UserToAddInDB(
+        username='Cached',
+        email='cached@example.ru',
+        hashed_password=b'hash'
+    ))
+    user = await user_repository.get_user(username='Cached')
+    balance = user.tokens_count
+
+    cache = BalanceCache(
+        ttl=60,
+        max_pending=10 ** 6,
+        flush_interval=60,
+        max_users=10
+    )
+
+    await cache.reserve(user.id, 1000)
+    assert await cache.get_balance(user.id) == balance - 1000
+
+    # The reservation is counted, so a concurrent request can't overspend
+    with pytest.raises(user_exceptions.UserTokensNotEnoughError):
+        await cache.reserve(user.id, balance)
+
+    cache.settle(user.id, 1000, 300)
+    await cache.debit(user.id, 200, min_tokens_count=0)
+
+    assert await cache.get_balance(user.id) == balance - 500
+    assert await user_repository.get_user_tokens_count(user.id) == balance
+
+    await cache.flush()
+
+    assert await user_repository.get_user_tokens_count(user.id) == (
+        balance - 500
+    )
+    assert await cache.get_balance(user.id) == balance - 500
+    assert cache.get_stats()['pending_tokens'] == 0
+
+    # Changed bypassing the cache
+    await user_repository.debit_user_tokens(user.id, 100, min_tokens_count=0)
+    assert await cache.get_balance(user.id) == balance - 500
+
+    cache.invalidate(user.id)
+    assert await cache.get_balance(user.id) == balance - 600
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_balance_cache_flushes_over_pending_limit():
+    cache = BalanceCache(
+        ttl=60,
+        max_pending=100,
+        flush_interval=60,
+        max_users=10
+    )
+
+    cache.add_debit(1, 50)
+    assert not cache.flush_needed.is_set()
+
+    cache.add_debit(1, 50)
+    assert cache.flush_needed.is_set()
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_balance_cache_ignores_read_older_than_flush(monkeypatch):
+    cache = BalanceCache(
+        ttl=60,
+        max_pending=10 ** 6,
+        flush_interval=60,
+        max_users=10
+    )
+    read_started = asyncio.Event()
+    flushed = asyncio.Event()
+    reads = []
+
+    async def get_user_tokens_count(user_id):
+        reads.append(user_id)
+        if len(reads) == 1:
+            # Read before the flush, returned after it
+            read_started.set()
+            await flushed.wait()
+            return 1000
+        return 900
+
+    async def apply_user_token_debits(debits):
+        return {user_id: 1000 - amount for user_id, amount in debits}
+
+    monkeypatch.setattr(
+        user_repository,
+        'get_user_tokens_count',
+        get_user_tokens_count
+    )
+    monkeypatch.setattr(
+        user_repository,
+        'apply_user_token_debits',
+        apply_user_token_debits
+    )
+
+    cache.add_debit(1, 100)
+    read = asyncio.create_task(cache.get_balance(1))
+    await read_started.wait()
+    await cache.flush()
+    flushed.set()
+
+    # The stale 1000 neither is returned nor overwrites the flushed 900
+    assert await read == 900
+    assert await cache.get_balance(1) == 900
+
+    # Invalidated during a read: the value is read again
+    read_started.clear()
+    flushed.clear()
+    reads.clear()
+    cache.invalidate(1)
+    read = asyncio.create_task(cache.get_balance(1))
+    await read_started.wait()
+    cache.invalidate(1)
+    flushed.set()
+
+    assert await read == 900
+    assert reads == [1, 1]
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_balance_cache_refuses_debits_while_flushes_fail(monkeypatch):
+    cache = BalanceCache(
+        ttl=60,
+        max_pending=100,
+        flush_interval=60,
+        max_users=10
+    )
+    cache.set_balance(1, 1000)
+
+    async def apply_user_token_debits(debits):
+        raise ConnectionError()
+
+    monkeypatch.setattr(
+        user_repository,
+        'apply_user_token_debits',
+        apply_user_token_debits
+    )
+
+    await cache.debit(1, 100, min_tokens_count=0)
+    with pytest.raises(ConnectionError):
+        await cache.flush()
+
+    # The unwritten debits are kept, but no more are taken on
+    assert cache.get_stats()['pending_tokens'] == 100
+    with pytest.raises(service_exceptions.ServiceBusyError):
+        await cache.reserve(1, 10)
+    with pytest.raises(service_exceptions.ServiceBusyError):
+        await cache.debit(1, 10, min_tokens_count=0)
+
+    async def apply_user_token_debits(debits):
+        return {1: 900}
+
+    monkeypatch.setattr(
+        user_repository,
+        'apply_user_token_debits',
+        apply_user_token_debits
+    )
+
+    await cache.flush()
+    await cache.reserve(1, 10)
+    assert await cache.get_balance(1) == 890
@@ -0,0 +1,38 @@
+import time
+
+from src.utils.cache_utils import LRUCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_lru_cache_expires_entries():
+    cache = LRUCache(maxsize=2)
+    cache.set('expired', 1, expires_at=time.time() - 1)
+    cache.set('alive', 2, expires_at=time.time() + 60)
+
+    assert cache.get('expired') is None
+    assert cache.get('alive') == 2
+    assert len(cache) == 1
+
+
+def test_lru_cache_counts_hits_and_misses():
+    cache = LRUCache(maxsize=1)
+    cache.set('a', 1)
+
+    cache.get('a')
+    cache.get('b')
+
+    stats = cache.get_stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
@@ -0,0 +1,46 @@
+import pytest
+
+from sqlalchemy import update
+
+from src.database.database import async_session
+from src.database.models import EssayCacheEntry
+from src.repositories import essay_cache_repository
+from src.utils.ai import essay_cache_utils
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_store_essay_reuses_expired_and_pruned_variants():
+    cache_key = 'expired-variants'
+    ttl = essay_cache_utils.get_ttl()
+
+    for variant in range(2):
+        await essay_cache_repository.add_essay_variant(
+            cache_key,
+            variant,
+            text=f'Old {variant}',
+            tokens=10,
+            ttl=ttl
+        )
+
+    # Variant 0 expired and isn't pruned yet, variant 2 was never stored
+    async with async_session() as session:
+        await session.execute(
+            update(EssayCacheEntry)
+            .where(
+                EssayCacheEntry.cache_key == cache_key,
+                EssayCacheEntry.variant == 0
+            )
+            .values(created_at=EssayCacheEntry.created_at - ttl)
+        )
+        await session.commit()
+
+    await essay_cache_utils.store_essay(cache_key, text='New', tokens=20)
+    await essay_cache_utils.store_essay(cache_key, text='Newer', tokens=30)
+
+    essay_cache_utils.essays_cache.delete(cache_key)
+    variants = await essay_cache_utils.get_essay_variants(cache_key)
+    assert [(essay.variant, essay.text) for essay in variants] == [
+        (0, 'New'),
+        (1, 'Old 1'),
+        (2, 'Newer')
+    ]
@@ -0,0 +1,34 @@
+from src.utils.metrics_utils import Counter, Histogram, metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram(
+        'test_duration_seconds',
+        'Test',
+        labels=('stage',),
+        buckets=(0.1, 1)
+    )
+    metrics.remove(histogram)
+
+    histogram.observe(0.05, 'a')
+    histogram.observe(0.5, 'a')
+    histogram.observe(5, 'a')
+
+    assert histogram.render()[2:] == [
+        'test_duration_seconds_bucket{stage="a",le="0.1"} 1',
+        'test_duration_seconds_bucket{stage="a",le="1"} 2',
+        'test_duration_seconds_bucket{stage="a",le="+Inf"} 3',
+        'test_duration_seconds_sum{stage="a"} 5.55',
+        'test_duration_seconds_count{stage="a"} 3'
+    ]
+
+
+def test_counter_counts_by_labels():
+    counter = Counter('test_total', 'Test', labels=('model',))
+    metrics.remove(counter)
+
+    counter.inc('a')
+    counter.inc('a', amount=2)
+    counter.inc('b')
+
+    assert counter.values == {('a',): 3, ('b',): 1}
@@ -0,0 +1,56 @@
+import httpx
+import pytest
+import asyncio
+
+from fastapi import FastAPI
+
+from src.core.config import settings
+from src.utils import profiling_utils
+
+
+@pytest.fixture
+def profiling_settings(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings.profiling, 'secret', 'secret')
+    monkeypatch.setattr(settings.profiling, 'dir', tmp_path)
+    monkeypatch.setattr(settings.profiling, 'max_profiles', 2)
+    return settings.profiling
+
+
+def test_verify_profile_header(profiling_settings):
+    header = profiling_utils.sign_profile_header()
+
+    assert profiling_utils.verify_profile_header(header)
+    assert not profiling_utils.verify_profile_header(header + '0')
+    assert not profiling_utils.verify_profile_header(
+        profiling_utils.sign_profile_header(expires_in=-1)
+    )
+    assert not profiling_utils.verify_profile_header('garbage')
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_middleware_profiles_signed_requests(profiling_settings):
+    app = FastAPI()
+
+    @app.get('/slow/')
+    async def slow():
+        await asyncio.sleep(0.01)
+        return {}
+
+    app.add_middleware(profiling_utils.ProfilingMiddleware)
+
+    async with httpx.AsyncClient(
+        base_url='http://test',
+        transport=httpx.ASGITransport(app=app)
+    ) as client:
+        response = await client.get('/slow/')
+        assert 'X-Profile-Id' not in response.headers
+
+        headers = {'X-Profile': profiling_utils.sign_profile_header()}
+        for _ in range(3):
+            response = await client.get('/slow/', headers=headers)
+
+    profile_id = response.headers['X-Profile-Id']
+    profiles = sorted(profiling_settings.dir.glob('*.html'))
+
+    assert len(profiles) == 2
+    assert profiles[-1].name == f'{profile_id}.html'
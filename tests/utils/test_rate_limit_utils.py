@@ -0,0 +1,137 @@
+import httpx
+import pytest
+
+from fastapi import FastAPI
+from starlette.datastructures import Headers
+
+from src.core.config import settings, RateLimitRule
+from src.utils import rate_limit_utils
+from src.utils.rate_limit_utils import (
+    MemoryRateLimitBackend,
+    RateLimitMiddleware,
+    get_client_ip,
+    get_route_group
+)
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_memory_backend_allows_burst_then_limits():
+    backend = MemoryRateLimitBackend(max_keys=10)
+    rule = RateLimitRule(rate=1, burst=3)
+
+    waits = [await backend.take('key', rule) for _ in range(4)]
+
+    assert waits[:3] == [0, 0, 0]
+    assert 0 < waits[3] <= 1
+    assert await backend.take('other', rule) == 0
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_memory_backend_charges_cost():
+    backend = MemoryRateLimitBackend(max_keys=10)
+    rule = RateLimitRule(rate=1, burst=10)
+
+    assert await backend.take('key', rule, cost=4) == 0
+    assert 0 < await backend.take('key', rule, cost=7) <= 1
+
+    # Over the burst: taken from a full bucket, then repaid
+    assert await backend.take('other', rule, cost=16) == 0
+    assert 5 < await backend.take('other', rule) <= 7
+
+
+def test_route_groups():
+    assert get_route_group('POST', '/api/ai/ask/') == 'ai'
+    assert get_route_group('POST', '/ai/compose/essay/') == 'ai'
+    assert get_route_group('POST', '/ai/compose/essay/jobs/') == 'ai'
+    assert get_route_group('GET', '/ai/compose/essay/jobs/1/') == 'users_me'
+    assert get_route_group('GET', '/users/me/tokens/') == 'users_me'
+    assert get_route_group('POST', '/users/login/') == 'auth'
+    assert get_route_group('GET', '/ai/minimum-tokens-for-ai/') == 'default'
+
+
+def test_client_ip(monkeypatch):
+    scope = {'client': ('10.0.0.1', 50000)}
+    headers = Headers({'x-forwarded-for': '1.1.1.1, 2.2.2.2, 3.3.3.3'})
+
+    assert get_client_ip(scope, headers) == '10.0.0.1'
+
+    # The entries on the left are set by the client
+    monkeypatch.setattr(settings.rate_limit, 'trusted_proxies', 1)
+    assert get_client_ip(scope, headers) == '3.3.3.3'
+    monkeypatch.setattr(settings.rate_limit, 'trusted_proxies', 2)
+    assert get_client_ip(scope, headers) == '2.2.2.2'
+    monkeypatch.setattr(settings.rate_limit, 'trusted_proxies', 5)
+    assert get_client_ip(scope, headers) == '1.1.1.1'
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_middleware_rejects_before_endpoint(monkeypatch):
+    monkeypatch.setattr(settings.rate_limit, 'enabled', True)
+    calls = []
+    app = FastAPI()
+
+    @app.post('/users/login/')
+    async def login():
+        calls.append(1)
+        return {}
+
+    app.add_middleware(
+        RateLimitMiddleware,
+        backend=MemoryRateLimitBackend(max_keys=10)
+    )
+
+    async with httpx.AsyncClient(
+        base_url='http://test',
+        transport=httpx.ASGITransport(app=app)
+    ) as client:
+        responses = [await client.post('/users/login/') for _ in range(60)]
+
+    rejected = [
+        response for response in responses
+        if response.status_code == 429
+    ]
+    assert rejected
+    assert int(rejected[0].headers['Retry-After']) >= 1
+    assert len(calls) == len(responses) - len(rejected)
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_middleware_limits_users_apart_from_address(monkeypatch):
+    monkeypatch.setattr(settings.rate_limit, 'enabled', True)
+    monkeypatch.setattr(settings.rate_limit, 'ip_multiplier', 1)
+    monkeypatch.setattr(
+        settings.rate_limit,
+        'groups',
+        {'default': RateLimitRule(rate=0.001, burst=2)}
+    )
+    monkeypatch.setattr(
+        rate_limit_utils,
+        'get_user_id',
+        lambda headers: headers.get('x-user')
+    )
+    app = FastAPI()
+
+    @app.get('/')
+    async def index():
+        return {}
+
+    app.add_middleware(
+        RateLimitMiddleware,
+        backend=MemoryRateLimitBackend(max_keys=10)
+    )
+
+    async with httpx.AsyncClient(
+        base_url='http://test',
+        transport=httpx.ASGITransport(app=app)
+    ) as client:
+        anonymous = [(await client.get('/')).status_code for _ in range(3)]
+        # Same address, the users have buckets of their own
+        users = [
+            (await client.get('/', headers={'x-user': user})).status_code
+            for user in ('1', '1', '2', '2')
+        ]
+        extra = await client.get('/', headers={'x-user': '1'})
+
+    assert anonymous == [200, 200, 429]
+    assert users == [200, 200, 200, 200]
+    assert extra.status_code == 429
@@ -0,0 +1,111 @@
+import asyncio
+import httpx
+import openai
+import pytest
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from src.enums.ai_models import Model
+from src.utils.ai.router_utils import Backend, ModelRouter
+
+
+def create_stand_in(name: str, delay: float = 0, status_code: int = 200):
+    """
+    Local OpenAI-compatible server answering with its own name
+    """
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.post('/v1/chat/completions')
+    async def chat_completions():
+        app.state.calls += 1
+        await asyncio.sleep(delay)
+
+        if status_code != 200:
+            return JSONResponse(
+                status_code=status_code,
+                content={'error': {'message': 'error'}}
+            )
+
+        return {
+            'id': 'chatcmpl',
+            'object': 'chat.completion',
+            'created': 0,
+            'model': Model.GPT_4O_MINI.value,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': name},
+                'finish_reason': 'stop'
+            }]
+        }
+
+    return app
+
+
+def create_backend(name: str, app: FastAPI) -> Backend:
+    client = openai.AsyncOpenAI(
+        api_key='test',
+        base_url=f'http://{name}/v1',
+        http_client=httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app)
+        ),
+        max_retries=0
+    )
+    return Backend(
+        name=name,
+        client=client,
+        models={Model.GPT_4O_MINI: Model.GPT_4O_MINI.value}
+    )
+
+
+async def ask(router: ModelRouter) -> str:
+    async def call(backend: Backend, upstream_model: str):
+        return await backend.client.chat.completions.create(
+            messages=[{'role': 'user', 'content': 'Hi'}],
+            model=upstream_model
+        )
+
+    _, completion = await router.request(Model.GPT_4O_MINI, call)
+    return completion.choices[0].message.content
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_router_fails_over_to_next_backend():
+    broken = create_stand_in('broken', status_code=500)
+    router = ModelRouter([
+        create_backend('broken', broken),
+        create_backend('working', create_stand_in('working'))
+    ])
+
+    assert await ask(router) == 'working'
+    assert broken.state.calls == 1
+    assert router.get_stats()['broken']['error_rate'] == 1.0
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_router_prefers_faster_backend():
+    router = ModelRouter([
+        create_backend('slow', create_stand_in('slow', delay=0.05)),
+        create_backend('fast', create_stand_in('fast'))
+    ])
+
+    # Both backends get measured first
+    await ask(router)
+    await ask(router)
+
+    assert await ask(router) == 'fast'
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_router_does_not_retry_client_errors():
+    rejecting = create_stand_in('rejecting', status_code=400)
+    working = create_stand_in('working')
+    router = ModelRouter([
+        create_backend('rejecting', rejecting),
+        create_backend('working', working)
+    ])
+
+    with pytest.raises(openai.BadRequestError):
+        await ask(router)
+    assert working.state.calls == 0
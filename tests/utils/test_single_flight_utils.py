@@ -0,0 +1,96 @@
+import asyncio
+import pytest
+
+from src.utils.single_flight_utils import SingleFlight
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_single_flight_shares_concurrent_calls():
+    flight = SingleFlight()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 'result'
+
+    results = await asyncio.gather(*[
+        flight.run('key', call) for _ in range(5)
+    ])
+
+    assert results == ['result'] * 5
+    assert len(calls) == 1
+    assert flight.get_stats() == {
+        'started_calls': 1,
+        'saved_calls': 4,
+        'in_flight': 0
+    }
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_single_flight_does_not_share_finished_calls():
+    flight = SingleFlight()
+
+    async def call():
+        return 'result'
+
+    await flight.run('key', call)
+    await flight.run('key', call)
+
+    assert flight.get_stats()['started_calls'] == 2
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_single_flight_outlives_cancelled_caller():
+    flight = SingleFlight()
+    finished = asyncio.Event()
+
+    async def call():
+        try:
+            await finished.wait()
+            return 'result'
+        finally:
+            calls.append(1)
+
+    calls = []
+    first = asyncio.create_task(flight.run('key', call))
+    second = asyncio.create_task(flight.run('key', call))
+    await asyncio.sleep(0)
+
+    # The call goes on for the second caller
+    first.cancel()
+    await asyncio.sleep(0)
+    assert not calls
+
+    finished.set()
+    assert await second == 'result'
+
+    # Without callers the call is cancelled
+    finished.clear()
+    third = asyncio.create_task(flight.run('key', call))
+    await asyncio.sleep(0)
+    third.cancel()
+    await asyncio.gather(third, return_exceptions=True)
+    await asyncio.sleep(0)
+
+    assert len(calls) == 2
+    assert flight.get_stats()['in_flight'] == 0
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_single_flight_caller_after_cancel_starts_new_call():
+    flight = SingleFlight()
+
+    async def call():
+        await asyncio.sleep(0.01)
+        return 'result'
+
+    first = asyncio.create_task(flight.run('key', call))
+    await asyncio.sleep(0)
+
+    # The second caller comes before the cancelled call is done
+    first.cancel()
+    second = asyncio.create_task(flight.run('key', call))
+
+    assert await second == 'result'
+    assert flight.get_stats()['started_calls'] == 2
@@ -0,0 +1,63 @@
+import pytest
+
+from datetime import datetime, UTC
+
+from src.enums.ai_models import Model
+from src.repositories import usage_repository
+from src.utils.usage_utils import UsageLedger
+
+
+def get_event(completion_tokens: int, endpoint: str = 'ask') -> dict:
+    return {
+        'user_id': 1000,
+        'model': Model.GPT_4O_MINI.value,
+        'endpoint': endpoint,
+        'prompt_tokens': 10,
+        'completion_tokens': completion_tokens,
+        'upstream_latency': 0.5,
+        'created_at': datetime.now(UTC).replace(tzinfo=None)
+    }
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_usage_ledger_flushes_events_into_daily_rollups():
+    ledger = UsageLedger(batch_size=2, flush_interval=60, max_buffered=10)
+
+    for completion_tokens in (100, 200, 300):
+        ledger.record(get_event(completion_tokens))
+    ledger.record(get_event(50, endpoint='compose_essay'))
+
+    assert ledger.batch_ready.is_set()
+
+    await ledger.flush()
+    ledger.record(get_event(400))
+    await ledger.flush()
+
+    assert ledger.get_stats() == {
+        'buffered': 0,
+        'flushed': 5,
+        'dropped': 0,
+        'failed_flushes': 0
+    }
+
+    rows = await usage_repository.get_daily_usage(
+        user_id=1000,
+        since=datetime.now(UTC).date()
+    )
+    ask = next(row for row in rows if row.endpoint == 'ask')
+
+    assert len(rows) == 2
+    assert ask.requests == 4
+    assert ask.prompt_tokens == 40
+    assert ask.completion_tokens == 1000
+    assert ask.upstream_latency == 2.0
+
+
+def test_usage_ledger_drops_events_over_limit():
+    ledger = UsageLedger(batch_size=10, flush_interval=60, max_buffered=2)
+
+    for completion_tokens in (100, 200, 300):
+        ledger.record(get_event(completion_tokens))
+
+    assert ledger.get_stats()['buffered'] == 2
+    assert ledger.get_stats()['dropped'] == 1
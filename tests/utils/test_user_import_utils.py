@@ -0,0 +1,36 @@
+import pytest
+
+from src.repositories import user_repository
+from src.utils import auth_utils
+from src.utils.user_import_utils import import_users
+
+
+@pytest.mark.asyncio(loop_scope='session')
+async def test_import_users():
+    lines = [
+        'username,email,password',
+        'Student1,student1@example.ru,secret1',
+        'Student2,student2@example.ru,secret2',
+        # Email taken by the row above
+        'Student3,student2@example.ru,secret3',
+        # Too short username
+        'St,student4@example.ru,secret4'
+    ]
+
+    result = await import_users(lines, batch_size=2, bcrypt_rounds=4)
+    assert (result.imported, result.skipped, result.invalid) == (2, 1, 1)
+
+    credentials = await user_repository.get_user_credentials(
+        username='Student2'
+    )
+    assert auth_utils.validate_password_sync(
+        'secret2',
+        credentials.hashed_password
+    )
+    # The cheap initial hash is upgraded on the first login
+    assert auth_utils.password_needs_rehash(credentials.hashed_password)
+    assert await user_repository.get_user_tokens_count(credentials.id) > 0
+
+    # Importing the same file again changes nothing
+    result = await import_users(lines, bcrypt_rounds=4)
+    assert (result.imported, result.skipped, result.invalid) == (0, 3, 1)